@@ -1,21 +1,93 @@
 """Base table generator classes."""
+import random
+import threading
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
-import yaml
+from mimesis import Generic
+from mimesis.locales import Locale
+from mimesis.providers.base import BaseProvider
+from mimesis.types import Seed
 from sqlalchemy import Connection, insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.schema import Table
 
+from sqlsynthgen.serialisation import SUFFIXES, SerialisationError, load
 from sqlsynthgen.utils import logger
 
 
+@dataclass
+class FanOut:
+    """How to generate the rows of a child table a parent row at a time.
+
+    Rather than `num_rows_per_pass` rows with foreign keys to random parents, each pass
+    goes through the parent rows that have no rows in the table yet, in the order of
+    their keys, and generates a random number of rows for each. The foreign key column
+    `foreign_key` of each row is set to its parent's key, so it needs no generator of
+    its own. Parents are split between the worker processes of create-data by their
+    keys. Parents that were given no rows are skipped in later passes, but, with more
+    than one worker or in later runs, are gone through again.
+
+    The numbers of rows per parent are drawn from `counts`, with relative probabilities
+    `weights`, or uniformly if there are none.
+    """
+
+    foreign_key: str
+    counts: list[int]
+    weights: Optional[list[float]] = None
+    # The key of the last parent row gone through.
+    last_parent_key: Any = field(default=None, init=False, repr=False)
+
+    @classmethod
+    def from_src_stats(
+        cls,
+        foreign_key: str,
+        group_by_result: list[dict[str, Any]],
+        count_column: str,
+        weights_column: str,
+    ) -> "FanOut":
+        """Make a FanOut from the result of a src-stats `GROUP BY` query.
+
+        For example, with a src-stats query `visits_per_person` of
+
+        .. code-block:: sql
+
+          SELECT num_visits, COUNT(*) AS num
+          FROM (
+            SELECT COUNT(*) AS num_visits FROM hospital_visit GROUP BY person_id
+          ) AS visit_counts
+          GROUP BY num_visits
+
+        `FanOut.from_src_stats("person_id", SRC_STATS["visits_per_person"],
+        "num_visits", "num")` generates as many visits per person as the source
+        database has, in the same proportions.
+        """
+        return cls(
+            foreign_key,
+            counts=[int(row[count_column]) for row in group_by_result],
+            weights=[float(row[weights_column]) for row in group_by_result],
+        )
+
+    def num_rows(self) -> int:
+        """Return a random number of rows to generate for a parent row."""
+        return random.choices(self.counts, self.weights)[0]
+
+
 class TableGenerator(ABC):
     """Abstract base class for table generator classes."""
 
     num_rows_per_pass: int = 1
+    # If set, rows are generated for each parent row instead, and num_rows_per_pass is
+    # ignored.
+    fan_out: Optional[FanOut] = None
+    # How many generated rows to buffer before writing them to the database with a
+    # single multi-row insert.
+    insert_batch_size: int = 1000
+    # How to write the batches: "insert" for multi-row INSERT statements, "copy" for
+    # PostgreSQL's COPY ... FROM STDIN.
+    insert_strategy: str = "insert"
 
     @abstractmethod
     def __call__(self, dst_db_conn: Connection) -> dict[str, Any]:
@@ -30,6 +102,70 @@ class TableGenerator(ABC):
         """
 
 
+class ThreadLocalGeneric:
+    """A mimesis `Generic` that keeps a separate instance for each thread.
+
+    Mimesis providers keep their random state in the instance, so threads sharing one
+    `Generic` would interleave their draws. Attribute access is delegated to the
+    calling thread's instance, which is created on first use with the locale and the
+    custom providers given to this object.
+
+    If a seed is given, the main thread uses it as is and other threads derive theirs
+    from it and their thread name.
+    """
+
+    def __init__(self, locale: Locale = Locale.DEFAULT, seed: Seed = None) -> None:
+        """Initialise a ThreadLocalGeneric.
+
+        Args:
+            locale: The locale of the `Generic` instances.
+            seed: The seed of the main thread's instance.
+        """
+        self._locale = locale
+        self._seed = seed
+        self._providers: list[tuple[type[BaseProvider], dict[str, Any]]] = []
+        self._local = threading.local()
+
+    def _thread_seed(self) -> Seed:
+        """Return the seed for the calling thread's instance."""
+        if self._seed is None or threading.current_thread() is threading.main_thread():
+            return self._seed
+        return f"{self._seed!r}-{threading.current_thread().name}"
+
+    def _generic(self) -> Generic:
+        """Return the calling thread's `Generic`, creating it if necessary."""
+        generic: Optional[Generic] = getattr(self._local, "generic", None)
+        if generic is None:
+            generic = Generic(locale=self._locale, seed=self._thread_seed())
+            for cls, kwargs in self._providers:
+                generic.add_provider(cls, **kwargs)
+            self._local.generic = generic
+        return generic
+
+    def add_provider(self, cls: type[BaseProvider], **kwargs: Any) -> None:
+        """Add a custom provider to the instances of all threads."""
+        self._providers.append((cls, kwargs))
+        self._generic().add_provider(cls, **kwargs)
+
+    def add_providers(self, *providers: type[BaseProvider]) -> None:
+        """Add several custom providers to the instances of all threads."""
+        for provider in providers:
+            self.add_provider(provider)
+
+    def reseed(self, seed: Seed = None) -> None:
+        """Reseed the calling thread's instance, and set the seed for new threads."""
+        self._seed = seed
+        self._generic().reseed(self._thread_seed())
+
+    def __getattr__(self, name: str) -> Any:
+        """Get an attribute, such as a provider, of the calling thread's instance."""
+        if name.startswith("_"):
+            # Avoid recursing through _generic when our own attributes aren't set yet,
+            # as happens when copying or unpickling.
+            raise AttributeError(name)
+        return getattr(self._generic(), name)
+
+
 @dataclass
 class FileUploader:
     """For uploading data files."""
@@ -38,19 +174,19 @@ class FileUploader:
 
     def load(self, connection: Connection) -> None:
         """Load the data from file."""
-        yaml_file = Path(self.table.fullname + ".yaml")
-        if not yaml_file.exists():
-            logger.warning("File %s not found. Skipping...", yaml_file)
+        data_files = [Path(self.table.fullname + suffix) for suffix in SUFFIXES]
+        data_file = next((path for path in data_files if path.exists()), None)
+        if data_file is None:
+            logger.warning("File %s not found. Skipping...", data_files[0])
             return
         try:
-            with yaml_file.open("r", newline="", encoding="utf-8") as yamlfile:
-                rows = yaml.load(yamlfile, Loader=yaml.Loader)
-        except yaml.YAMLError as e:
-            logger.warning("Error reading YAML file %s: %s", yaml_file, e)
+            rows = load(data_file, unsafe=True)
+        except SerialisationError as e:
+            logger.warning("Error reading file %s: %s", data_file, e)
             return
 
         if not rows:
-            logger.warning("No rows in %s. Skipping...", yaml_file)
+            logger.warning("No rows in %s. Skipping...", data_file)
             return
 
         try:
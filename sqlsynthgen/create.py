@@ -1,21 +1,85 @@
 """Functions and classes to create and populate the target database."""
+# pylint: disable=too-many-lines
+import asyncio
+import datetime as dt
+import functools
+import io
+import itertools
+import json
+import random
+import zlib
 from collections import Counter
-from typing import Any, Generator, Mapping, Sequence, Tuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from types import ModuleType
+from typing import (
+    Any,
+    Callable,
+    Generator,
+    Iterable,
+    Iterator,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
 
-from sqlalchemy import Connection, insert
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy.schema import CreateSchema, MetaData, Table
+from sqlalchemy import (
+    ColumnElement,
+    Connection,
+    CursorResult,
+    Dialect,
+    Engine,
+    ForeignKeyConstraint,
+    Index,
+    insert,
+    inspect,
+    literal_column,
+    select,
+    text,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import (
+    CreateIndex,
+    CreateSchema,
+    DropIndex,
+    MetaData,
+    Table,
+)
+from sqlalchemy.sql import functions
 
-from sqlsynthgen.base import FileUploader, TableGenerator
+from sqlsynthgen.base import FanOut, FileUploader, TableGenerator
+from sqlsynthgen.key_allocation import PrimaryKeyAllocator
+from sqlsynthgen.key_samplers import key_sampler_registry
+from sqlsynthgen.pipeline import InsertFunction, RowWriterPipeline
 from sqlsynthgen.settings import get_settings
-from sqlsynthgen.utils import create_db_engine, get_sync_engine, logger
+from sqlsynthgen.unique_generator import get_worker, set_worker
+from sqlsynthgen.utils import (
+    create_db_engine,
+    get_orm_metadata,
+    get_sync_engine,
+    import_file,
+    logger,
+)
 
 Story = Generator[Tuple[str, dict[str, Any]], dict[str, Any], None]
 RowCounts = Counter[str]
+T = TypeVar("T")
 
+# The number of times in a row that generating new rows to replace rows skipped by the
+# on_conflict_do_nothing insert strategy may fail to write any, before giving up.
+MAX_CONFLICT_ROUNDS = 100
 
-def create_db_tables(metadata: MetaData) -> None:
-    """Create tables described by the sqlalchemy metadata object."""
+
+def create_db_tables(metadata: MetaData, bulk_load: bool = False) -> None:
+    """Create tables described by the sqlalchemy metadata object.
+
+    If `bulk_load` is set, the tables are created without their indexes and foreign
+    keys, which makes writing data to them faster. `finalise_db_tables` adds them
+    once the data is in.
+    """
     settings = get_settings()
     dst_dsn: str = settings.dst_dsn or ""
     assert dst_dsn != "", "Missing DST_DSN setting."
@@ -33,6 +97,194 @@ def create_db_tables(metadata: MetaData) -> None:
         engine = get_sync_engine(create_db_engine(dst_dsn, schema_name=schema_name))
 
     metadata.create_all(engine)
+    if bulk_load:
+        # Creating everything and then dropping what we defer, rather than creating
+        # bare tables, lets create_all take care of things like enum types.
+        _drop_deferred_schema_items(engine, metadata)
+
+
+def _foreign_key_signature(
+    constrained_columns: Sequence[str],
+    referred_table: str,
+    referred_columns: Sequence[str],
+) -> tuple[tuple[str, ...], str, tuple[str, ...]]:
+    """Return what identifies a foreign key, whatever it's called."""
+    return tuple(constrained_columns), referred_table, tuple(referred_columns)
+
+
+def _existing_foreign_keys(
+    connection: Connection, table: Table
+) -> dict[tuple[tuple[str, ...], str, tuple[str, ...]], str]:
+    """Return the names of the foreign keys `table` has in the database."""
+    return {
+        _foreign_key_signature(
+            fkey["constrained_columns"],
+            fkey["referred_table"],
+            fkey["referred_columns"],
+        ): fkey["name"]
+        for fkey in inspect(connection).get_foreign_keys(
+            table.name, schema=table.schema
+        )
+        if fkey["name"] is not None
+    }
+
+
+def _metadata_foreign_key_signature(
+    constraint: ForeignKeyConstraint,
+) -> tuple[tuple[str, ...], str, tuple[str, ...]]:
+    """Return what identifies a foreign key of the metadata, whatever it's called."""
+    return _foreign_key_signature(
+        constraint.column_keys,
+        constraint.elements[0].column.table.name,
+        [element.column.name for element in constraint.elements],
+    )
+
+
+def _drop_deferred_schema_items(engine: Engine, metadata: MetaData) -> None:
+    """Drop the indexes and foreign keys of the tables, ready for bulk loading."""
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            existing_foreign_keys = _existing_foreign_keys(connection, table)
+            for constraint in table.foreign_key_constraints:
+                name = existing_foreign_keys.get(
+                    _metadata_foreign_key_signature(constraint)
+                )
+                if name is not None:
+                    connection.execute(
+                        text(
+                            f"ALTER TABLE {_format_table(connection, table)} "
+                            f"DROP CONSTRAINT {_quote(connection, name)}"
+                        )
+                    )
+            for index in table.indexes:
+                connection.execute(DropIndex(index, if_exists=True))
+    logger.debug("Indexes and foreign keys deferred until finalise-tables.")
+
+
+def _format_table(connection: Connection, table: Table) -> str:
+    """Return the quoted, and if necessary schema-qualified, name of `table`."""
+    return str(connection.dialect.identifier_preparer.format_table(table))
+
+
+def _quote(connection: Connection, name: str) -> str:
+    """Quote an identifier, such as a constraint name, if necessary."""
+    return str(connection.dialect.identifier_preparer.quote(name))
+
+
+def _create_index(engine: Engine, index: Index) -> None:
+    """Create an index, unless it exists already, on a connection of its own."""
+    logger.debug('Creating index "%s".', index.name)
+    with engine.begin() as connection:
+        connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+def _foreign_key_name(constraint: ForeignKeyConstraint) -> str:
+    """Return the name of a foreign key, or the name PostgreSQL would give it."""
+    if constraint.name:
+        return str(constraint.name)
+    name = "_".join([constraint.table.name, *constraint.column_keys, "fkey"])
+    # PostgreSQL truncates identifiers to 63 bytes.
+    return name[:63]
+
+
+def _add_foreign_key(connection: Connection, constraint: ForeignKeyConstraint) -> None:
+    """Add a foreign key to a table that already holds data.
+
+    On PostgreSQL, the key is added as NOT VALID, which doesn't check the existing rows
+    and so only holds its lock briefly. It must then be checked by
+    `_validate_foreign_key`, in a later transaction.
+    """
+    name = _foreign_key_name(constraint)
+    referred_table = constraint.elements[0].column.table
+    columns = ", ".join(_quote(connection, key) for key in constraint.column_keys)
+    referred_columns = ", ".join(
+        _quote(connection, element.column.name) for element in constraint.elements
+    )
+    sql = (
+        f"ALTER TABLE {_format_table(connection, constraint.table)} "
+        f"ADD CONSTRAINT {_quote(connection, name)} "
+        f"FOREIGN KEY ({columns}) "
+        f"REFERENCES {_format_table(connection, referred_table)} ({referred_columns})"
+    )
+    if constraint.ondelete:
+        sql += f" ON DELETE {constraint.ondelete}"
+    if constraint.onupdate:
+        sql += f" ON UPDATE {constraint.onupdate}"
+    logger.debug('Adding foreign key "%s".', name)
+    if connection.dialect.name == "postgresql":
+        sql += " NOT VALID"
+    connection.execute(text(sql))
+
+
+def _validate_foreign_key(connection: Connection, table: Table, name: str) -> None:
+    """Check the existing rows against a foreign key added as NOT VALID.
+
+    Validating doesn't block writes to either table while it scans them, but only if
+    it isn't in the transaction that added the key, which holds a stronger lock. Keys
+    that are already valid are left alone.
+    """
+    logger.debug('Validating foreign key "%s".', name)
+    connection.execute(
+        text(
+            f"ALTER TABLE {_format_table(connection, table)} "
+            f"VALIDATE CONSTRAINT {_quote(connection, name)}"
+        )
+    )
+
+
+def finalise_db_tables(metadata: MetaData, workers: int = 1) -> None:
+    """Add the indexes and foreign keys deferred by a bulk load, and analyse the tables.
+
+    Indexes are created concurrently, each on its own connection, by `workers` threads
+    if the database is PostgreSQL, and one after another otherwise. On PostgreSQL, each
+    foreign key is added as NOT VALID in a transaction of its own, and once they all
+    are, each is validated in another, so no lock is held for longer than one step.
+    Indexes and foreign keys that already exist are left alone, so this can safely be
+    run more than once.
+    """
+    settings = get_settings()
+    dst_dsn: str = settings.dst_dsn or ""
+    assert dst_dsn != "", "Missing DST_DSN setting."
+
+    indexes = [index for table in metadata.sorted_tables for index in table.indexes]
+    engine = get_sync_engine(
+        create_db_engine(
+            dst_dsn, schema_name=settings.dst_schema, pool_size=max(workers, 5)
+        )
+    )
+    if engine.dialect.name != "postgresql":
+        workers = 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [
+            executor.submit(_create_index, engine, index) for index in indexes
+        ]:
+            future.result()
+
+    foreign_keys = []
+    for table in metadata.sorted_tables:
+        with engine.connect() as connection:
+            existing_foreign_keys = _existing_foreign_keys(connection, table)
+        for constraint in table.foreign_key_constraints:
+            name = existing_foreign_keys.get(
+                _metadata_foreign_key_signature(constraint)
+            )
+            if name is None:
+                # Each key is committed as soon as it's added, to release the lock.
+                with engine.begin() as connection:
+                    _add_foreign_key(connection, constraint)
+                name = _foreign_key_name(constraint)
+            foreign_keys.append((table, name))
+    if engine.dialect.name == "postgresql":
+        # Keys that exist already may be left NOT VALID by an earlier, failed run.
+        for table, name in foreign_keys:
+            with engine.begin() as connection:
+                _validate_foreign_key(connection, table, name)
+
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as connection:
+            for table in metadata.sorted_tables:
+                connection.execute(text(f"ANALYZE {_format_table(connection, table)}"))
+        logger.debug("Tables analysed.")
 
 
 def create_db_vocab(vocab_dict: Mapping[str, FileUploader]) -> None:
@@ -59,25 +311,393 @@ def create_db_data(
     table_generator_dict: Mapping[str, TableGenerator],
     story_generator_list: Sequence[Mapping[str, Any]],
     num_passes: int,
+    config: Optional[Mapping[str, Any]] = None,
 ) -> RowCounts:
-    """Connect to a database and populate it with data."""
+    """Connect to a database and populate it with data.
+
+    `config` is the configuration file as a dictionary. Its `parallel-tables` key sets
+    how many tables may be filled concurrently, `writer-threads` and `write-queue-size`
+    turn on pipelined writing, and `use-asyncio` writes through asyncpg on
+    `async-connections` connections concurrently.
+    """
     settings = get_settings()
     dst_dsn: str = settings.dst_dsn or ""
     assert dst_dsn != "", "Missing DST_DSN setting."
 
+    config = config or {}
+    key_sampler_registry.max_age = config.get("key-cache-max-age")
+    if config.get("use-asyncio", False):
+        return asyncio.get_event_loop().run_until_complete(
+            _create_db_data_async(
+                dst_dsn,
+                settings.dst_schema,
+                sorted_tables,
+                table_generator_dict,
+                story_generator_list,
+                num_passes,
+                config,
+            )
+        )
+
+    parallel_tables: int = config.get("parallel-tables", 1)
+    writer_threads: int = config.get("writer-threads", 0)
+    if writer_threads > 0 and parallel_tables > 1:
+        logger.warning(
+            "parallel-tables is ignored when writer-threads is set. "
+            "Tables will be generated one after another."
+        )
+        parallel_tables = 1
+    engine_kwargs: dict[str, Any] = {}
+    if parallel_tables > 1 or writer_threads > 0:
+        # One connection for each table being filled or each writer thread, and one
+        # for the main thread.
+        engine_kwargs["pool_size"] = max(parallel_tables, writer_threads) + 1
     dst_engine = get_sync_engine(
-        create_db_engine(dst_dsn, schema_name=settings.dst_schema)
+        create_db_engine(dst_dsn, schema_name=settings.dst_schema, **engine_kwargs)
     )
 
+    pipeline = None
+    if writer_threads > 0:
+        pipeline = RowWriterPipeline(
+            dst_engine, writer_threads, config.get("write-queue-size", 16)
+        )
+    key_allocator = _make_key_allocator(config)
     row_counts: Counter[str] = Counter()
-    with dst_engine.connect() as dst_conn:
+    try:
+        with dst_engine.connect() as dst_conn:
+            for _ in range(num_passes):
+                row_counts += populate(
+                    dst_conn,
+                    sorted_tables,
+                    table_generator_dict,
+                    story_generator_list,
+                    parallel_tables=parallel_tables,
+                    pipeline=pipeline,
+                    key_allocator=key_allocator,
+                    story_batch_size=config.get("story-batch-size", 1),
+                    story_transaction_size=config.get("story-transaction-size"),
+                )
+            if key_allocator is not None:
+                # The sequences are moved past the keys written, so the rows still
+                # queued have to be written first.
+                if pipeline is not None:
+                    pipeline.wait_for_all()
+                with dst_conn.begin():
+                    key_allocator.fix_sequences(dst_conn, sorted_tables)
+    finally:
+        if pipeline is not None:
+            pipeline.close()
+    if pipeline is not None:
+        row_counts += pipeline.row_counts
+    return row_counts
+
+
+def _make_key_allocator(config: Mapping[str, Any]) -> Optional[PrimaryKeyAllocator]:
+    """Return a primary key allocator if the config asks for one, or else `None`."""
+    block_size: Optional[int] = config.get("primary-key-block-size")
+    return PrimaryKeyAllocator(block_size) if block_size else None
+
+
+async def _create_db_data_async(  # pylint: disable=too-many-arguments,too-many-locals
+    dst_dsn: str,
+    dst_schema: Optional[str],
+    sorted_tables: Sequence[Table],
+    table_generator_dict: Mapping[str, TableGenerator],
+    story_generator_list: Sequence[Mapping[str, Any]],
+    num_passes: int,
+    config: Mapping[str, Any],
+) -> RowCounts:
+    """Populate a database with data, over several asynchronous connections.
+
+    Each pass first runs all the stories, then fills the tables level by level in the
+    foreign key graph. The stories, and the batches of rows of the tables of a level,
+    are spread over `async-connections` connections that write concurrently. The
+    generators themselves are synchronous and get a synchronous view of the
+    connection they run on.
+    """
+    for ignored_key in ("parallel-tables", "writer-threads"):
+        if ignored_key in config:
+            logger.warning("%s is ignored when use-asyncio is set.", ignored_key)
+    num_connections: int = config.get("async-connections", 4)
+    dst_engine = create_db_engine(
+        dst_dsn, schema_name=dst_schema, use_asyncio=True, pool_size=num_connections
+    )
+    assert isinstance(dst_engine, AsyncEngine)
+    key_allocator = _make_key_allocator(config)
+    table_dict = {table.name: table for table in sorted_tables}
+    levels = _table_levels(_tables_to_fill(sorted_tables, table_generator_dict))
+    insert_functions = {
+        table.name: _get_insert_function(
+            table, table_generator_dict[table.name], dst_engine.dialect
+        )
+        for level in levels
+        for table in level
+    }
+    row_counts: Counter[str] = Counter()
+    try:
         for _ in range(num_passes):
-            row_counts += populate(
-                dst_conn,
-                sorted_tables,
-                table_generator_dict,
+            story_tasks = _story_tasks(
                 story_generator_list,
+                table_dict,
+                table_generator_dict,
+                key_allocator,
+                config.get("story-batch-size", 1),
+                config.get("story-transaction-size"),
+            )
+            row_counts += await _run_concurrently(
+                dst_engine, story_tasks, num_connections
+            )
+            for level in levels:
+                batch_tasks = []
+                for table in level:
+                    logger.debug('Generating data for table "%s".', table.name)
+                    table_generator = table_generator_dict[table.name]
+                    if table_generator.fan_out is not None:
+                        # The parent rows are paged through in order, so the whole
+                        # table is one task.
+                        batch_tasks.append(
+                            functools.partial(
+                                _populate_fan_out_table,
+                                table=table,
+                                table_generator=table_generator,
+                                insert_function=insert_functions[table.name],
+                            )
+                        )
+                        continue
+                    batch_tasks += [
+                        functools.partial(
+                            _populate_batch,
+                            table=table,
+                            table_generator=table_generator,
+                            insert_function=insert_functions[table.name],
+                            num_rows=num_rows,
+                        )
+                        for num_rows in _batch_sizes(table_generator)
+                    ]
+                row_counts += await _run_concurrently(
+                    dst_engine, batch_tasks, num_connections
+                )
+        if key_allocator is not None:
+            async with dst_engine.begin() as dst_conn:
+                await dst_conn.run_sync(key_allocator.fix_sequences, sorted_tables)
+    finally:
+        await dst_engine.dispose()
+    return row_counts
+
+
+async def _run_concurrently(
+    dst_engine: AsyncEngine,
+    tasks: Iterable[Callable[[Connection], RowCounts]],
+    num_connections: int,
+) -> RowCounts:
+    """Run the tasks, each in its own transaction, on up to `num_connections` connections.
+
+    Each task is a synchronous function of a connection, run with
+    `AsyncConnection.run_sync`. Tasks are taken in order by whichever connection is
+    free, so the order they finish in isn't defined. `tasks` may be a lazy iterator,
+    in which case each task is only created when a connection is free to run it.
+    """
+    remaining_tasks = iter(tasks)
+
+    async def run_tasks() -> RowCounts:
+        row_counts: Counter[str] = Counter()
+        task = next(remaining_tasks, None)
+        if task is None:
+            return row_counts
+        async with dst_engine.connect() as dst_conn:
+            while task is not None:
+                async with dst_conn.begin():
+                    row_counts += await dst_conn.run_sync(task)
+                task = next(remaining_tasks, None)
+        return row_counts
+
+    results = await asyncio.gather(*(run_tasks() for _ in range(num_connections)))
+    return sum(results, Counter())
+
+
+def _run_stories(
+    dst_conn: Connection,
+    story_generators: Sequence[tuple[str, Callable[[Connection], Story]]],
+    table_dict: Mapping[str, Table],
+    table_generator_dict: Mapping[str, TableGenerator],
+    key_allocator: Optional[PrimaryKeyAllocator],
+) -> RowCounts:
+    """Create a story with each story function and write their rows on `dst_conn`."""
+    stories = []
+    for name, story_function in story_generators:
+        logger.debug('Generating data for story "%s".', name)
+        stories.append(story_function(dst_conn))
+    return _populate_stories(
+        stories, table_dict, table_generator_dict, dst_conn, key_allocator
+    )
+
+
+def _run_stories_in_savepoints(
+    dst_conn: Connection,
+    story_batches: Sequence[Sequence[tuple[str, Callable[[Connection], Story]]]],
+    table_dict: Mapping[str, Table],
+    table_generator_dict: Mapping[str, TableGenerator],
+    key_allocator: Optional[PrimaryKeyAllocator],
+) -> RowCounts:
+    """Run several batches of stories in the current transaction, each in a savepoint.
+
+    A batch that fails with a database error, for instance by breaking a constraint,
+    is rolled back to its savepoint and logged, and the other batches carry on. Other
+    errors, such as bugs in a story generator, are raised as usual.
+    """
+    row_counts: Counter[str] = Counter()
+    for story_generators in story_batches:
+        try:
+            with dst_conn.begin_nested():
+                batch_row_counts = _run_stories(
+                    dst_conn,
+                    story_generators,
+                    table_dict,
+                    table_generator_dict,
+                    key_allocator,
+                )
+        except SQLAlchemyError as e:
+            logger.warning(
+                "Rolled back %s after a database error: %s",
+                ", ".join(f'story "{name}"' for name, _ in story_generators),
+                e,
             )
+        else:
+            row_counts += batch_row_counts
+    return row_counts
+
+
+def _populate_stories(
+    stories: Sequence[Story],
+    table_dict: Mapping[str, Table],
+    table_generator_dict: Mapping[str, TableGenerator],
+    dst_conn: Connection,
+    key_allocator: Optional[PrimaryKeyAllocator],
+) -> RowCounts:
+    """Write the rows of the stories, in lockstep if there is more than one."""
+    if len(stories) == 1:
+        return _populate_story(
+            stories[0], table_dict, table_generator_dict, dst_conn, key_allocator
+        )
+    return _populate_stories_in_lockstep(
+        stories, table_dict, table_generator_dict, dst_conn, key_allocator
+    )
+
+
+def _populate_batch(
+    dst_conn: Connection,
+    table: Table,
+    table_generator: TableGenerator,
+    insert_function: InsertFunction,
+    num_rows: int,
+) -> RowCounts:
+    """Generate `num_rows` rows for `table` and write them on `dst_conn`."""
+    rows = [table_generator(dst_conn) for _ in range(num_rows)]
+    return Counter(
+        {
+            table.name: _write_rows(
+                table, table_generator, insert_function, rows, dst_conn
+            )
+        }
+    )
+
+
+def seed_generators(ssg_module: ModuleType, seed: Optional[str]) -> None:
+    """Seed the random number generators used by a generators module.
+
+    This seeds both Python's `random` module, used by many row and story generators,
+    and the module's mimesis `generic`. A seed of `None` seeds them from the operating
+    system's source of randomness.
+
+    Seeding only makes runs reproducible when the rows are generated in one thread.
+    With `parallel-tables`, the tables' threads draw from the shared `random` module,
+    as `FanOut` and the key samplers do, in whatever order they get to run, and the
+    threads of the pool don't fill the same tables from one run to the next.
+    """
+    random.seed(seed)
+    ssg_module.generic.reseed(seed)
+
+
+def _split_passes(num_passes: int, workers: int) -> list[int]:
+    """Split `num_passes` as evenly as possible between at most `workers` workers."""
+    quotient, remainder = divmod(num_passes, workers)
+    passes = [quotient + (1 if i < remainder else 0) for i in range(workers)]
+    return [worker_passes for worker_passes in passes if worker_passes > 0]
+
+
+def _create_db_data_worker(  # pylint: disable=too-many-arguments
+    orm_file: str,
+    ssg_file: str,
+    config: Mapping[str, Any],
+    num_passes: int,
+    seed: Optional[str],
+    worker_index: int = 0,
+    num_workers: int = 1,
+) -> RowCounts:
+    """Populate the database from a worker process of `create_db_data_in_workers`.
+
+    `worker_index` and `num_workers` are passed to `set_worker`, so that values of
+    `PermutedSequence`s are never made by two workers.
+    """
+    set_worker(worker_index, num_workers)
+    orm_module = import_file(orm_file)
+    ssg_module = import_file(ssg_file)
+    # Forked workers inherit the random state of the parent, so always reseed.
+    seed_generators(ssg_module, seed)
+    orm_metadata = get_orm_metadata(orm_module, config.get("tables", {}))
+    return create_db_data(
+        orm_metadata.sorted_tables,
+        ssg_module.table_generator_dict,
+        ssg_module.story_generator_list,
+        num_passes,
+        config,
+    )
+
+
+def create_db_data_in_workers(  # pylint: disable=too-many-arguments
+    orm_file: str,
+    ssg_file: str,
+    config: Mapping[str, Any],
+    num_passes: int,
+    workers: int,
+    seed: Optional[int] = None,
+) -> RowCounts:
+    """Populate a database with data, splitting the passes between worker processes.
+
+    Each worker imports the ORM and generators files itself, opens its own connection
+    to the destination database and runs its share of the passes.
+
+    Args:
+        orm_file: Path to the ORM file.
+        ssg_file: Path to the generators file.
+        config: The configuration file as a dictionary.
+        num_passes: The total number of passes to make.
+        workers: The number of worker processes.
+        seed: If given, worker `i` seeds its random number generators with
+            `f"{seed}-{i}"`, so that runs are reproducible. Otherwise they are seeded
+            from the operating system's source of randomness.
+
+    Returns:
+        The number of rows created in each table, summed over the workers.
+    """
+    worker_passes = _split_passes(num_passes, workers)
+    row_counts: Counter[str] = Counter()
+    with ProcessPoolExecutor(max_workers=len(worker_passes) or 1) as executor:
+        futures = [
+            executor.submit(
+                _create_db_data_worker,
+                orm_file,
+                ssg_file,
+                config,
+                passes,
+                None if seed is None else f"{seed}-{index}",
+                index,
+                len(worker_passes),
+            )
+            for index, passes in enumerate(worker_passes)
+        ]
+        for future in futures:
+            row_counts += future.result()
     return row_counts
 
 
@@ -86,89 +706,915 @@ def _populate_story(
     table_dict: Mapping[str, Table],
     table_generator_dict: Mapping[str, TableGenerator],
     dst_conn: Connection,
+    key_allocator: Optional[PrimaryKeyAllocator] = None,
 ) -> RowCounts:
-    """Write to the database all the rows created by the given story."""
+    """Write to the database all the rows created by the given story.
+
+    If a `key_allocator` is given, rows whose primary keys it can allocate don't need
+    to be read back after they are inserted. Those are held back and written in
+    batches, in the order the story made them, before the next row that does need
+    reading back and at the end of the story. Rows of tables written with the
+    on_conflict_do_nothing insert strategy are always written straight away, see
+    `_insert_story_row_on_conflict`.
+    """
     # Loop over the rows generated by the story, insert them into their
     # respective tables. Ideally this would say
     # `for table_name, provided_values in story:`
     # but we have to loop more manually to be able to use the `send` function.
     row_counts: Counter[str] = Counter()
+    pending_rows: list[tuple[Table, dict[str, Any]]] = []
     try:
         table_name, provided_values = next(story)
         while True:
             table = table_dict[table_name]
-            if table.name in table_generator_dict:
-                table_generator = table_generator_dict[table.name]
-                default_values = table_generator(dst_conn)
-            else:
-                default_values = {}
-            insert_values = {**default_values, **provided_values}
-            stmt = insert(table).values(insert_values).return_defaults()
-            cursor = dst_conn.execute(stmt)
-            # We need to return all the default values etc. to the generator,
-            # because other parts of the story may refer to them.
-            if cursor.returned_defaults:
-                # pylint: disable=protected-access
-                return_values = {
-                    str(k): v for k, v in cursor.returned_defaults._mapping.items()
-                }
-                # pylint: enable=protected-access
+            insert_values = _story_row_values(
+                table, provided_values, table_generator_dict, dst_conn
+            )
+            skips_conflicts = _skips_conflicts(table, table_generator_dict, dst_conn)
+            primary_key = None
+            if (
+                key_allocator is not None
+                and not skips_conflicts
+                and not any(
+                    column.name in insert_values for column in table.primary_key.columns
+                )
+            ):
+                primary_key = key_allocator.allocate(dst_conn, table)
+            if primary_key is not None:
+                final_values = {**insert_values, **primary_key}
+                pending_rows.append((table, final_values))
             else:
-                return_values = {}
-            final_values = {**insert_values, **return_values}
+                _write_story_rows(pending_rows, table_generator_dict, dst_conn)
+                pending_rows = []
+                if skips_conflicts:
+                    final_values = _insert_story_row_on_conflict(
+                        table,
+                        insert_values,
+                        provided_values,
+                        table_generator_dict[table_name],
+                        dst_conn,
+                    )
+                else:
+                    final_values = _insert_story_row(table, insert_values, dst_conn)
             row_counts[table_name] = row_counts.get(table_name, 0) + 1
             table_name, provided_values = story.send(final_values)
     except StopIteration:
         # The story has finished, it has no more rows to generate
         pass
+    _write_story_rows(pending_rows, table_generator_dict, dst_conn)
+    return row_counts
+
+
+def _populate_stories_in_lockstep(  # pylint: disable=too-many-locals
+    stories: Sequence[Story],
+    table_dict: Mapping[str, Table],
+    table_generator_dict: Mapping[str, TableGenerator],
+    dst_conn: Connection,
+    key_allocator: Optional[PrimaryKeyAllocator] = None,
+) -> RowCounts:
+    """Write to the database the rows created by several stories, run side by side.
+
+    The stories are advanced one row at a time in lockstep. Each round, the next rows
+    of all the unfinished stories are grouped by table and by the columns they set,
+    each group is written with a single multi-row INSERT ... RETURNING, and each story
+    is sent back the values of its own row. A row only depends on the earlier rows of
+    its story, which were written in earlier rounds.
+    """
+    row_counts: Counter[str] = Counter()
+    # The next row of each story that hasn't finished yet.
+    next_rows: list[tuple[Story, str, dict[str, Any]]] = []
+    for story in stories:
+        try:
+            next_rows.append((story, *next(story)))
+        except StopIteration:
+            pass
+    while next_rows:
+        # The stories waiting for each group of rows, and the values of their rows.
+        groups: dict[
+            tuple[str, tuple[str, ...]],
+            list[tuple[Story, dict[str, Any], dict[str, Any]]],
+        ]
+        groups = {}
+        for story, table_name, provided_values in next_rows:
+            table = table_dict[table_name]
+            insert_values = _story_row_values(
+                table, provided_values, table_generator_dict, dst_conn
+            )
+            if (
+                key_allocator is not None
+                and not _skips_conflicts(table, table_generator_dict, dst_conn)
+                and not any(
+                    column.name in insert_values for column in table.primary_key.columns
+                )
+            ):
+                insert_values.update(key_allocator.allocate(dst_conn, table) or {})
+            groups.setdefault((table_name, tuple(insert_values)), []).append(
+                (story, provided_values, insert_values)
+            )
+            row_counts[table_name] = row_counts.get(table_name, 0) + 1
+        next_rows = []
+        for (table_name, _), group in groups.items():
+            table = table_dict[table_name]
+            if _skips_conflicts(table, table_generator_dict, dst_conn):
+                # Rows that conflict are generated again one at a time.
+                final_rows = [
+                    _insert_story_row_on_conflict(
+                        table,
+                        insert_values,
+                        provided_values,
+                        table_generator_dict[table_name],
+                        dst_conn,
+                    )
+                    for _, provided_values, insert_values in group
+                ]
+            else:
+                final_rows = _insert_story_rows(
+                    table, [values for _, _, values in group], dst_conn
+                )
+            for (story, _, _), final_values in zip(group, final_rows):
+                try:
+                    next_rows.append((story, *story.send(final_values)))
+                except StopIteration:
+                    pass
     return row_counts
 
 
-def populate(
+def _story_row_values(
+    table: Table,
+    provided_values: dict[str, Any],
+    table_generator_dict: Mapping[str, TableGenerator],
+    dst_conn: Connection,
+) -> dict[str, Any]:
+    """Return the values to insert for a story row, filling in any it didn't set."""
+    if table.name in table_generator_dict:
+        table_generator = table_generator_dict[table.name]
+        default_values = table_generator(dst_conn)
+    else:
+        default_values = {}
+    return {**default_values, **provided_values}
+
+
+def _insert_story_rows(
+    table: Table, rows: list[dict[str, Any]], dst_conn: Connection
+) -> list[dict[str, Any]]:
+    """Insert rows that set the same columns, and return their values.
+
+    The values of the columns the rows didn't set are read back with RETURNING, in
+    the order of `rows`.
+    """
+    returned_columns = [
+        column for column in table.columns if column.name not in rows[0]
+    ]
+    if not returned_columns:
+        _insert_rows(table, rows, dst_conn)
+        return rows
+    stmt = insert(table).returning(*returned_columns, sort_by_parameter_order=True)
+    final_rows = [
+        {**values, **{str(k): v for k, v in returned_values.items()}}
+        for values, returned_values in zip(
+            rows, dst_conn.execute(stmt, rows).mappings()
+        )
+    ]
+    key_sampler_registry.record_inserted_rows(table, final_rows, dst_conn)
+    return final_rows
+
+
+def _insert_story_row(
+    table: Table, insert_values: dict[str, Any], dst_conn: Connection
+) -> dict[str, Any]:
+    """Insert a row and return its values, including those the database filled in."""
+    stmt = insert(table).values(insert_values).return_defaults()
+    final_values = {**insert_values, **_returned_defaults(dst_conn.execute(stmt))}
+    key_sampler_registry.record_inserted_rows(table, [final_values], dst_conn)
+    return final_values
+
+
+def _insert_story_row_on_conflict(
+    table: Table,
+    insert_values: dict[str, Any],
+    provided_values: dict[str, Any],
+    table_generator: TableGenerator,
+    dst_conn: Connection,
+) -> dict[str, Any]:
+    """Insert a row with ON CONFLICT DO NOTHING and return its values.
+
+    A story row can't be skipped, as later rows of the story may refer to it. So while
+    it conflicts with an existing row, the values that the story didn't provide are
+    generated again, as `_write_rows` does for the rows of a table.
+
+    Raises:
+        RuntimeError: If the row conflicts `MAX_CONFLICT_ROUNDS` times in a row, as it
+            will if the values the story provided conflict.
+    """
+    for _ in range(MAX_CONFLICT_ROUNDS):
+        stmt = (
+            postgresql.insert(table)
+            .values(insert_values)
+            .on_conflict_do_nothing()
+            .return_defaults()
+        )
+        cursor = dst_conn.execute(stmt)
+        if cursor.rowcount:
+            final_values = {**insert_values, **_returned_defaults(cursor)}
+            key_sampler_registry.record_inserted_rows(table, [final_values], dst_conn)
+            return final_values
+        insert_values = {**table_generator(dst_conn), **provided_values}
+    raise RuntimeError(
+        f"Failed to write a story row to {table.name} that doesn't conflict with its "
+        f"existing rows after {MAX_CONFLICT_ROUNDS} attempts."
+    )
+
+
+def _returned_defaults(cursor: CursorResult) -> dict[str, Any]:
+    """Return the values the database filled in for a row inserted by `cursor`."""
+    # We need to return all the default values etc. to the generator,
+    # because other parts of the story may refer to them.
+    if not cursor.returned_defaults:
+        return {}
+    mapping = cursor.returned_defaults._mapping  # pylint: disable=protected-access
+    return {str(k): v for k, v in mapping.items()}
+
+
+def _skips_conflicts(
+    table: Table,
+    table_generator_dict: Mapping[str, TableGenerator],
+    dst_conn: Connection,
+) -> bool:
+    """Return whether rows of `table` are written with INSERT ... ON CONFLICT."""
+    return (
+        table.name in table_generator_dict
+        and _get_insert_function(
+            table, table_generator_dict[table.name], dst_conn.dialect
+        )
+        is _insert_rows_on_conflict_do_nothing
+    )
+
+
+def _write_story_rows(
+    rows: Sequence[tuple[Table, dict[str, Any]]],
+    table_generator_dict: Mapping[str, TableGenerator],
+    dst_conn: Connection,
+) -> None:
+    """Write rows of a story, in order, batching consecutive rows of the same shape.
+
+    Rows of tables with a table generator are written with its insert strategy.
+    """
+    for (table, _), batch in itertools.groupby(
+        rows, key=lambda row: (row[0], tuple(row[1].keys()))
+    ):
+        if table.name in table_generator_dict:
+            insert_function = _get_insert_function(
+                table, table_generator_dict[table.name], dst_conn.dialect
+            )
+        else:
+            insert_function = _insert_rows
+        insert_function(table, [values for _, values in batch], dst_conn)
+
+
+def _insert_rows(table: Table, rows: list[dict[str, Any]], dst_conn: Connection) -> int:
+    """Write rows to a table with a single executemany.
+
+    SQLAlchemy turns this into multi-row INSERT statements ("insertmanyvalues") for
+    dialects that support them, so a batch costs a single statement compilation and only
+    a few round trips.
+    """
+    dst_conn.execute(insert(table), rows)
+    key_sampler_registry.record_inserted_rows(table, rows, dst_conn)
+    return len(rows)
+
+
+def _copy_value(value: Any) -> str:
+    """Serialise a Python value as a field of PostgreSQL's COPY text format."""
+    if value is None:
+        return r"\N"
+    if isinstance(value, bool):
+        field = "t" if value else "f"
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        # bytea in hex format. The backslash gets escaped below.
+        field = "\\x" + bytes(value).hex()
+    elif isinstance(value, (dt.date, dt.time)):
+        # This covers datetimes too, which are a subclass of dates.
+        field = value.isoformat()
+    elif isinstance(value, dt.timedelta):
+        field = (
+            f"{value.days} days {value.seconds} seconds "
+            f"{value.microseconds} microseconds"
+        )
+    elif isinstance(value, (dict, list)):
+        field = json.dumps(value, default=str)
+    else:
+        # Numbers, strings, UUIDs, etc.
+        field = str(value)
+    return (
+        field.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copy_rows(table: Table, rows: list[dict[str, Any]], dst_conn: Connection) -> int:
+    """Write rows to a table with PostgreSQL's `COPY ... FROM STDIN`.
+
+    The rows are serialised in the COPY text format and streamed through psycopg2's
+    `copy_expert`, on the same connection and in the same transaction as `dst_conn`.
+    Only the columns present in the rows are copied, so the others get their server
+    defaults, and their scalar client-side defaults are filled in, as they would be
+    with an INSERT. Rows with different columns are copied in separate batches, and
+    rows that leave out columns with other client-side defaults are inserted instead.
+    """
+    column_names = list(rows[0].keys())
+    if any(row.keys() != rows[0].keys() for row in rows):
+        # COPY, like an executemany, needs the same columns for every row.
+        for _, batch in itertools.groupby(rows, key=lambda row: tuple(row.keys())):
+            _copy_rows(table, list(batch), dst_conn)
+        return len(rows)
+    if not column_names:
+        # COPY needs at least one column, fall back to inserting default rows.
+        return _insert_rows(table, rows, dst_conn)
+    defaults = {}
+    for column in table.columns:
+        if column.name in rows[0] or column.default is None:
+            continue
+        if not column.default.is_scalar:
+            # Callable and SQL expression defaults are for SQLAlchemy to evaluate.
+            return _insert_rows(table, rows, dst_conn)
+        defaults[column.name] = column.default.arg  # type: ignore[attr-defined]
+    if defaults:
+        rows = [{**row, **defaults} for row in rows]
+        column_names += list(defaults)
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(row[name]) for name in column_names))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    preparer = dst_conn.dialect.identifier_preparer
+    columns = ", ".join(preparer.quote(name) for name in column_names)
+    copy_sql = f"COPY {preparer.format_table(table)} ({columns}) FROM STDIN"
+    cursor = dst_conn.connection.cursor()
+    try:
+        cursor.copy_expert(copy_sql, buffer)
+    finally:
+        cursor.close()
+    key_sampler_registry.record_inserted_rows(table, rows, dst_conn)
+    return len(rows)
+
+
+def _insert_rows_on_conflict_do_nothing(
+    table: Table, rows: list[dict[str, Any]], dst_conn: Connection
+) -> int:
+    """Write rows to a table, skipping those that would break a unique constraint.
+
+    The rows are written with a single executemany of PostgreSQL's
+    `INSERT ... ON CONFLICT DO NOTHING`, so the database itself skips rows whose keys
+    are already in the table, whoever wrote them, or earlier in the batch. Only the
+    primary keys of the rows that were written are read back, with RETURNING.
+
+    Returns:
+        The number of rows written, which may be fewer than the rows given.
+    """
+    key_columns = list(table.primary_key.columns)
+    returned_columns: list[ColumnElement[Any]] = [*key_columns] or [literal_column("1")]
+    stmt = (
+        postgresql.insert(table).on_conflict_do_nothing().returning(*returned_columns)
+    )
+    returned_rows = dst_conn.execute(stmt, rows).all()
+    written_rows = [
+        {column.name: value for column, value in zip(key_columns, returned_row)}
+        for returned_row in returned_rows
+    ]
+    if key_columns and all(column.name in rows[0] for column in key_columns):
+        # Pick out the rows written by their keys, to tell the key samplers about all
+        # their values, unless the keys come back as different types.
+        written_keys = {tuple(returned_row) for returned_row in returned_rows}
+        matching_rows = [
+            row
+            for row in rows
+            if tuple(row[column.name] for column in key_columns) in written_keys
+        ]
+        if len(matching_rows) == len(returned_rows):
+            written_rows = matching_rows
+    key_sampler_registry.record_inserted_rows(table, written_rows, dst_conn)
+    return len(returned_rows)
+
+
+INSERT_STRATEGIES: Mapping[str, InsertFunction] = {
+    "insert": _insert_rows,
+    "copy": _copy_rows,
+    "on_conflict_do_nothing": _insert_rows_on_conflict_do_nothing,
+}
+
+
+def _get_insert_function(
+    table: Table, table_generator: TableGenerator, dialect: Dialect
+) -> InsertFunction:
+    """Return the function to write rows of `table` with, as its generator asks for."""
+    return INSERT_STRATEGIES[
+        _resolve_insert_strategy(
+            table.name, table_generator.insert_strategy, dialect.name, dialect.driver
+        )
+    ]
+
+
+@functools.lru_cache(maxsize=None)
+def _resolve_insert_strategy(
+    table_name: str, strategy: str, dialect_name: str, driver: str
+) -> str:
+    """Return the insert strategy to use for a table, falling back if need be.
+
+    This is cached, so that stories, which look it up for every batch of rows they
+    write, only warn once for each table about a strategy the database can't do.
+    """
+    if strategy not in INSERT_STRATEGIES:
+        raise ValueError(f'Unknown insert strategy "{strategy}" for {table_name}.')
+    if strategy == "copy" and driver != "psycopg2":
+        logger.warning(
+            "The copy insert strategy needs PostgreSQL with psycopg2. "
+            "Inserting rows into %s with INSERT statements instead.",
+            table_name,
+        )
+        strategy = "insert"
+    if strategy == "on_conflict_do_nothing" and dialect_name != "postgresql":
+        logger.warning(
+            "The on_conflict_do_nothing insert strategy needs PostgreSQL. "
+            "Inserting rows into %s with INSERT statements instead.",
+            table_name,
+        )
+        strategy = "insert"
+    return strategy
+
+
+def _populate_table(
+    table: Table,
+    table_generator: TableGenerator,
+    dst_conn: Connection,
+) -> int:
+    """Write a pass of new rows to the given table.
+
+    That is `table_generator.num_rows_per_pass` rows, or, if the generator has a
+    `fan_out`, a number of rows for each new parent row, see `_generate_batches`.
+    Rows are buffered and written `table_generator.insert_batch_size` at a time, using
+    the insert strategy set by `table_generator.insert_strategy`.
+
+    Returns:
+        The number of rows written.
+    """
+    insert_function = _get_insert_function(table, table_generator, dst_conn.dialect)
+    return _write_batches(table, table_generator, insert_function, dst_conn)
+
+
+def _write_batches(
+    table: Table,
+    table_generator: TableGenerator,
+    insert_function: InsertFunction,
+    dst_conn: Connection,
+) -> int:
+    """Generate a pass of rows for `table` and write them with `insert_function`."""
+    num_rows = 0
+    for rows in _generate_batches(table, table_generator, dst_conn):
+        if table_generator.fan_out is None:
+            num_rows += _write_rows(
+                table, table_generator, insert_function, rows, dst_conn
+            )
+        else:
+            # Skipped rows aren't replaced, as each belongs to a particular parent.
+            num_rows += insert_function(table, rows, dst_conn)
+    return num_rows
+
+
+def _write_rows(
+    table: Table,
+    table_generator: TableGenerator,
+    insert_function: InsertFunction,
+    rows: list[dict[str, Any]],
+    dst_conn: Connection,
+) -> int:
+    """Write `rows` with `insert_function`, generating new rows for any it skips.
+
+    Only the on_conflict_do_nothing insert strategy skips rows, those that conflict
+    with rows already in the table. New rows are generated and written until as many
+    rows as were given have been written.
+
+    Returns:
+        The number of rows written, which is `len(rows)`.
+
+    Raises:
+        RuntimeError: If `MAX_CONFLICT_ROUNDS` sets of new rows in a row all conflict.
+    """
+    num_rows = insert_function(table, rows, dst_conn)
+    empty_rounds = 0
+    while num_rows < len(rows):
+        if empty_rounds == MAX_CONFLICT_ROUNDS:
+            raise RuntimeError(
+                f"Failed to write rows to {table.name} that don't conflict with its "
+                f"existing rows after {MAX_CONFLICT_ROUNDS} attempts."
+            )
+        new_rows = [table_generator(dst_conn) for _ in range(len(rows) - num_rows)]
+        num_new_rows = insert_function(table, new_rows, dst_conn)
+        empty_rounds = 0 if num_new_rows else empty_rounds + 1
+        num_rows += num_new_rows
+    return num_rows
+
+
+def _replacing_skipped_rows(
+    table_generator: TableGenerator, insert_function: InsertFunction
+) -> InsertFunction:
+    """Return an insert function that writes rows with `_write_rows`.
+
+    The rows `insert_function` skips are replaced with new ones from `table_generator`.
+    """
+
+    def write_rows(
+        table: Table, rows: list[dict[str, Any]], dst_conn: Connection
+    ) -> int:
+        return _write_rows(table, table_generator, insert_function, rows, dst_conn)
+
+    return write_rows
+
+
+def _populate_fan_out_table(
+    dst_conn: Connection,
+    table: Table,
+    table_generator: TableGenerator,
+    insert_function: InsertFunction,
+) -> RowCounts:
+    """Generate a pass of rows for a fan-out `table` and write them on `dst_conn`."""
+    return Counter(
+        {table.name: _write_batches(table, table_generator, insert_function, dst_conn)}
+    )
+
+
+def _generate_batches(
+    table: Table, table_generator: TableGenerator, dst_conn: Connection
+) -> Iterator[list[dict[str, Any]]]:
+    """Generate a pass of rows for `table`, in batches to be written.
+
+    Without a `fan_out`, that is `table_generator.num_rows_per_pass` rows. With one,
+    the parent rows with no rows in `table` yet are read in batches, in the order of
+    their keys, and a random number of rows is generated for each, see `_fan_out_rows`.
+    """
+    fan_out = table_generator.fan_out
+    if fan_out is None:
+        for num_rows in _batch_sizes(table_generator):
+            yield [table_generator(dst_conn) for _ in range(num_rows)]
+        return
+    batch_size = max(table_generator.insert_batch_size, 1)
+    yield from _chunks(
+        _fan_out_rows(table, table_generator, fan_out, dst_conn), batch_size
+    )
+
+
+def _fan_out_rows(  # pylint: disable=too-many-locals
+    table: Table, table_generator: TableGenerator, fan_out: FanOut, dst_conn: Connection
+) -> Iterator[dict[str, Any]]:
+    """Generate rows for each parent row of `table` that has none yet.
+
+    With several worker processes, each only goes through its share of the parents,
+    see `_is_workers_parent`. With one, the parents up to `fan_out.last_parent_key`,
+    which were gone through in earlier passes but may have been given no rows, are
+    skipped too.
+    """
+    foreign_keys = table.columns[fan_out.foreign_key].foreign_keys
+    if len(foreign_keys) != 1:
+        raise ValueError(
+            f"Can't fan out {table.name} over {fan_out.foreign_key}, "
+            "it must have exactly one foreign key."
+        )
+    (foreign_key,) = foreign_keys
+    parent_column = foreign_key.column
+    # An alias, in case the table is its own parent.
+    child_table = table.alias()
+    has_children = (
+        select(child_table.columns[fan_out.foreign_key])
+        .where(child_table.columns[fan_out.foreign_key] == parent_column)
+        .exists()
+    )
+    # Only go through the parents there are at the start, so that when the table is
+    # its own parent the rows written don't become childless parents to fan out over
+    # in turn, which would never end.
+    max_parent_key = dst_conn.execute(select(functions.max(parent_column))).scalar()
+    if max_parent_key is None:
+        return
+    worker_index, num_workers = get_worker()
+    # Other workers' parents may be committed after this worker's later ones, so the
+    # last key gone through can only be skipped to with a single worker.
+    last_parent_key = fan_out.last_parent_key if num_workers == 1 else None
+    batch_size = max(table_generator.insert_batch_size, 1)
+    while True:
+        # Page through the parents by key, rather than holding a cursor open while
+        # we write.
+        query = (
+            select(parent_column)
+            .where(~has_children, parent_column <= max_parent_key)
+            .order_by(parent_column)
+            .limit(batch_size)
+        )
+        if last_parent_key is not None:
+            query = query.where(parent_column > last_parent_key)
+        parent_keys = dst_conn.execute(query).scalars().all()
+        if not parent_keys:
+            return
+        for parent_key in parent_keys:
+            if _is_workers_parent(parent_key, worker_index, num_workers):
+                for _ in range(fan_out.num_rows()):
+                    yield {**table_generator(dst_conn), fan_out.foreign_key: parent_key}
+            last_parent_key = parent_key
+            fan_out.last_parent_key = parent_key
+
+
+def _is_workers_parent(parent_key: Any, worker_index: int, num_workers: int) -> bool:
+    """Return whether a worker process fans out over a parent, by its key.
+
+    Integer keys are split between the workers by their remainders, and other keys by
+    a checksum, which unlike `hash` is the same in every process.
+    """
+    if num_workers == 1:
+        return True
+    if not isinstance(parent_key, int):
+        parent_key = zlib.crc32(str(parent_key).encode())
+    return bool(parent_key % num_workers == worker_index)
+
+
+def _batch_sizes(table_generator: TableGenerator) -> list[int]:
+    """Return the sizes of the batches a pass of `table_generator` is written in."""
+    batch_size = max(table_generator.insert_batch_size, 1)
+    num_rows = table_generator.num_rows_per_pass
+    return [
+        min(batch_size, num_rows - batch_start)
+        for batch_start in range(0, num_rows, batch_size)
+    ]
+
+
+def _queue_table(
+    table: Table,
+    table_generator: TableGenerator,
+    dst_conn: Connection,
+    pipeline: RowWriterPipeline,
+) -> None:
+    """Generate a pass of rows for `table` and queue them to be written by `pipeline`.
+
+    The rows are generated once the rows queued for the tables that `table` references
+    have been written, so that generators can look up their keys.
+    """
+    pipeline.wait_for(_referenced_tables(table))
+    logger.debug('Generating data for table "%s".', table.name)
+    insert_function = _get_insert_function(table, table_generator, dst_conn.dialect)
+    if (
+        insert_function is _insert_rows_on_conflict_do_nothing
+        and table_generator.fan_out is None
+    ):
+        # The writer threads generate new rows for any the insert function skips, as
+        # `_write_batches` does.
+        insert_function = _replacing_skipped_rows(table_generator, insert_function)
+    # Generators only read from the database, but do it within a transaction so that
+    # the connection is free for the next story's transaction afterwards.
+    with dst_conn.begin():
+        for rows in _generate_batches(table, table_generator, dst_conn):
+            pipeline.put(table, rows, insert_function)
+
+
+def _populate_table_in_transaction(
+    table: Table,
+    table_generator: TableGenerator,
+    dst_conn: Connection,
+) -> int:
+    """Run `_populate_table` within a transaction of its own."""
+    logger.debug('Generating data for table "%s".', table.name)
+    with dst_conn.begin():
+        return _populate_table(table, table_generator, dst_conn)
+
+
+def _populate_table_on_new_connection(
+    table: Table,
+    table_generator: TableGenerator,
+    dst_engine: Engine,
+) -> int:
+    """Run `_populate_table_in_transaction` on a new connection from `dst_engine`."""
+    with dst_engine.connect() as dst_conn:
+        return _populate_table_in_transaction(table, table_generator, dst_conn)
+
+
+def _referenced_tables(table: Table) -> set[str]:
+    """Return the full names of the tables that `table` has foreign keys to."""
+    return {fkey.target_fullname.rsplit(".", 1)[0] for fkey in table.foreign_keys}
+
+
+def _table_levels(tables: Sequence[Table]) -> list[list[Table]]:
+    """Group topologically sorted tables by their depth in the foreign key graph.
+
+    A table's level is one more than the highest level of the tables it references, so
+    the tables of one level only reference tables of earlier levels. References to
+    tables that aren't in `tables`, and those that close a cycle, are ignored.
+
+    Args:
+        tables: Tables sorted so that referenced tables come first, as in
+            `MetaData.sorted_tables`.
+
+    Returns:
+        A list of levels, each a list of tables in the order they came in `tables`.
+    """
+    table_levels: dict[str, int] = {}
+    levels: list[list[Table]] = []
+    for table in tables:
+        level = 1 + max(
+            (
+                table_levels[name]
+                for name in _referenced_tables(table)
+                if name in table_levels
+            ),
+            default=-1,
+        )
+        table_levels[table.fullname] = level
+        if level == len(levels):
+            levels.append([])
+        levels[level].append(table)
+    return levels
+
+
+def _populate_tables_in_parallel(
+    tables: Sequence[Table],
+    table_generator_dict: Mapping[str, TableGenerator],
+    dst_engine: Engine,
+    max_workers: int,
+) -> RowCounts:
+    """Fill the tables level by level, filling the tables of each level concurrently.
+
+    The tables of a level are filled by a pool of `max_workers` threads, each table on
+    its own connection and in its own transaction. A level only starts once all the
+    tables it may reference have been committed.
+    """
+    row_counts: Counter[str] = Counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for level in _table_levels(tables):
+            futures = {
+                table.name: executor.submit(
+                    _populate_table_on_new_connection,
+                    table,
+                    table_generator_dict[table.name],
+                    dst_engine,
+                )
+                for table in level
+            }
+            for table_name, future in futures.items():
+                row_counts[table_name] = row_counts.get(table_name, 0) + future.result()
+    return row_counts
+
+
+def _tables_to_fill(
+    tables: Sequence[Table], table_generator_dict: Mapping[str, TableGenerator]
+) -> list[Table]:
+    """Return the tables that a pass of the table generators writes rows to."""
+    return [
+        table
+        for table in tables
+        # We may not have a generator for a table, probably because it's a vocabulary
+        # table.
+        if table.name in table_generator_dict
+        and (
+            table_generator_dict[table.name].num_rows_per_pass != 0
+            or table_generator_dict[table.name].fan_out is not None
+        )
+    ]
+
+
+def _interleave_story_generators(
+    story_generator_list: Sequence[Mapping[str, Any]],
+) -> Iterator[tuple[str, Callable[[Connection], Story]]]:
+    """Yield the name and function of each story to run in a pass.
+
+    Stories of different story generators take turns, until each story generator has
+    had `num_stories_per_pass` turns.
+    """
+    remaining = [
+        itertools.repeat((sg["name"], sg["function"]), sg["num_stories_per_pass"])
+        for sg in story_generator_list
+    ]
+    while remaining:
+        unfinished = []
+        for story_generators in remaining:
+            story_generator = next(story_generators, None)
+            if story_generator is not None:
+                yield story_generator
+                unfinished.append(story_generators)
+        remaining = unfinished
+
+
+def _chunks(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Yield lists of up to `size` consecutive items, taking items only as needed."""
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def _batch_story_generators(
+    story_generator_list: Sequence[Mapping[str, Any]], story_batch_size: int
+) -> Iterator[list[tuple[str, Callable[[Connection], Story]]]]:
+    """Yield the stories to run in a pass, in batches of up to `story_batch_size`."""
+    return _chunks(_interleave_story_generators(story_generator_list), story_batch_size)
+
+
+def _story_tasks(  # pylint: disable=too-many-arguments
+    story_generator_list: Sequence[Mapping[str, Any]],
+    table_dict: Mapping[str, Table],
+    table_generator_dict: Mapping[str, TableGenerator],
+    key_allocator: Optional[PrimaryKeyAllocator],
+    story_batch_size: int,
+    story_transaction_size: Optional[int],
+) -> Iterator[Callable[[Connection], RowCounts]]:
+    """Yield functions that each run one transaction's worth of the stories of a pass.
+
+    Without a `story_transaction_size`, each function runs a single batch of
+    `story_batch_size` stories. With one, each runs as many batches as fit in
+    `story_transaction_size` stories, but at least one, each batch in a savepoint of
+    its own, see `_run_stories_in_savepoints`.
+    """
+    story_batches = _batch_story_generators(story_generator_list, story_batch_size)
+    if story_transaction_size is None:
+        for story_batch in story_batches:
+            yield functools.partial(
+                _run_stories,
+                story_generators=story_batch,
+                table_dict=table_dict,
+                table_generator_dict=table_generator_dict,
+                key_allocator=key_allocator,
+            )
+        return
+    batches_per_transaction = max(1, story_transaction_size // story_batch_size)
+    for transaction_batches in _chunks(story_batches, batches_per_transaction):
+        yield functools.partial(
+            _run_stories_in_savepoints,
+            story_batches=transaction_batches,
+            table_dict=table_dict,
+            table_generator_dict=table_generator_dict,
+            key_allocator=key_allocator,
+        )
+
+
+def populate(  # pylint: disable=too-many-arguments,too-many-locals
     dst_conn: Connection,
     tables: Sequence[Table],
     table_generator_dict: Mapping[str, TableGenerator],
     story_generator_list: Sequence[Mapping[str, Any]],
+    parallel_tables: int = 1,
+    pipeline: Optional[RowWriterPipeline] = None,
+    key_allocator: Optional[PrimaryKeyAllocator] = None,
+    story_batch_size: int = 1,
+    story_transaction_size: Optional[int] = None,
 ) -> RowCounts:
-    """Populate a database schema with synthetic data."""
+    """Populate a database schema with synthetic data.
+
+    Stories are run first, one after another or, if `story_batch_size` is more than
+    one, that many at a time in lockstep, see `_populate_stories_in_lockstep`. Each
+    batch of stories is a transaction, unless `story_transaction_size` is given, see
+    `_story_tasks`. Then the tables are filled row by row, one after another or, if
+    `parallel_tables` is more than one, with that many tables filled concurrently on
+    connections of their own.
+
+    If a `pipeline` is given, table rows are instead queued for its writer threads to
+    write, and this returns without waiting for them to be written. The stories of the
+    next pass wait for them, as story generators may read any table. Those rows are
+    counted in the pipeline's `row_counts` rather than in the counts returned.
+
+    If a `key_allocator` is given, it assigns the primary keys of story rows where it
+    can, see `_populate_story`.
+    """
     row_counts: Counter[str] = Counter()
+    if pipeline is not None and story_generator_list:
+        pipeline.wait_for_all()
     table_dict = {table.name: table for table in tables}
     # Generate stories
     # Each story generator returns a python generator (an unfortunate naming clash with
     # what we call generators). Iterating over it yields individual rows for the
-    # database. First, collect all of the python generators into a single list.
-    stories: list[tuple[str, Story]] = sum(
-        [
-            [
-                (sg["name"], sg["function"](dst_conn))
-                for _ in range(sg["num_stories_per_pass"])
-            ]
-            for sg in story_generator_list
-        ],
-        [],
-    )
-    for name, story in stories:
-        # Run the inserts for each story within a transaction.
-        logger.debug('Generating data for story "%s".', name)
+    # database. The python generators are only created when their batch comes up, so
+    # that no more than `story_batch_size` of them exist at a time.
+    for story_task in _story_tasks(
+        story_generator_list,
+        table_dict,
+        table_generator_dict,
+        key_allocator,
+        story_batch_size,
+        story_transaction_size,
+    ):
+        # Run the inserts for each batch of stories within a transaction.
         with dst_conn.begin():
-            row_counts += _populate_story(
-                story, table_dict, table_generator_dict, dst_conn
-            )
+            row_counts += story_task(dst_conn)
 
     # Generate individual rows, table by table.
-    for table in tables:
-        if table.name not in table_generator_dict:
-            # We don't have a generator for this table, probably because it's a
-            # vocabulary table.
-            continue
-        table_generator = table_generator_dict[table.name]
-        if table_generator.num_rows_per_pass == 0:
-            continue
-        logger.debug('Generating data for table "%s".', table.name)
-        # Run all the inserts for one table in a transaction
-        with dst_conn.begin():
-            for _ in range(table_generator.num_rows_per_pass):
-                stmt = insert(table).values(table_generator(dst_conn))
-                dst_conn.execute(stmt)
-                row_counts[table.name] = row_counts.get(table.name, 0) + 1
+    tables_to_fill = _tables_to_fill(tables, table_generator_dict)
+    if pipeline is not None:
+        for table in tables_to_fill:
+            _queue_table(table, table_generator_dict[table.name], dst_conn, pipeline)
+    elif parallel_tables > 1:
+        row_counts += _populate_tables_in_parallel(
+            tables_to_fill, table_generator_dict, dst_conn.engine, parallel_tables
+        )
+    else:
+        for table in tables_to_fill:
+            row_counts[table.name] = row_counts.get(
+                table.name, 0
+            ) + _populate_table_in_transaction(
+                table, table_generator_dict[table.name], dst_conn
+            )
     return row_counts
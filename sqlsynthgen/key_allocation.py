@@ -0,0 +1,128 @@
+"""Module for the PrimaryKeyAllocator class."""
+from collections import deque
+from typing import Optional, Sequence
+
+from sqlalchemy import Column, Connection, Table, bindparam, text
+
+from sqlsynthgen.utils import logger
+
+
+class PrimaryKeyAllocator:
+    """Hands out primary keys from blocks reserved from their sequences.
+
+    Rather than have the database assign a primary key to each row, and ask for it back
+    with a RETURNING clause, keys are reserved in blocks of `block_size` with one
+    `nextval` query per block and assigned to rows before they are inserted. Keys left
+    unused at the end of a run leave gaps, as they would after a rolled back insert.
+
+    Only PostgreSQL tables with a single integer primary key backed by a sequence, and
+    no other values generated by the database, are handled. For those, `allocate`
+    returns a key. For other tables it returns `None`, and the database has to assign
+    the key as usual.
+    """
+
+    def __init__(self, block_size: int) -> None:
+        """Initialise a PrimaryKeyAllocator.
+
+        Args:
+            block_size: The number of keys to reserve from a sequence at a time.
+        """
+        self.block_size = block_size
+        # The sequence of each table's primary key, or None if it has none we can use.
+        self._sequences: dict[str, Optional[str]] = {}
+        self._reserved_keys: dict[str, deque[int]] = {}
+
+    @staticmethod
+    def _allocatable_column(table: Table) -> Optional[Column]:
+        """Return the primary key column of `table`, if we may assign its values."""
+        if len(table.primary_key.columns) != 1:
+            return None
+        (column,) = table.primary_key.columns
+        if column.identity is not None and column.identity.always:
+            # GENERATED ALWAYS AS IDENTITY columns don't accept explicit values.
+            return None
+        try:
+            if not issubclass(column.type.python_type, int):
+                return None
+        except NotImplementedError:
+            return None
+        for other_column in table.columns:
+            if other_column is not column and (
+                other_column.server_default is not None
+                or other_column.server_onupdate is not None
+                or other_column.computed is not None
+                or other_column.identity is not None
+            ):
+                # The row would need to be read back anyway.
+                return None
+        return column
+
+    def _sequence(self, dst_conn: Connection, table: Table) -> Optional[str]:
+        """Return the sequence to take primary keys of `table` from, if there is one."""
+        if table.fullname not in self._sequences:
+            sequence = None
+            column = self._allocatable_column(table)
+            if column is not None and dst_conn.dialect.name == "postgresql":
+                preparer = dst_conn.dialect.identifier_preparer
+                sequence = dst_conn.execute(
+                    text("SELECT pg_get_serial_sequence(:table_name, :column_name)"),
+                    {
+                        "table_name": preparer.format_table(table),
+                        "column_name": column.name,
+                    },
+                ).scalar()
+            self._sequences[table.fullname] = sequence
+        return self._sequences[table.fullname]
+
+    def allocate(self, dst_conn: Connection, table: Table) -> Optional[dict[str, int]]:
+        """Return a new primary key for a row of `table`, or `None` if we can't.
+
+        Returns:
+            A dictionary with the name of the primary key column as the key and the
+            newly allocated primary key as the value.
+        """
+        sequence = self._sequence(dst_conn, table)
+        if sequence is None:
+            return None
+        reserved_keys = self._reserved_keys.setdefault(table.fullname, deque())
+        while True:
+            try:
+                key = reserved_keys.popleft()
+                break
+            except IndexError:
+                reserved_keys.extend(self._reserve(dst_conn, sequence))
+        (column,) = table.primary_key.columns
+        return {column.name: key}
+
+    def _reserve(self, dst_conn: Connection, sequence: str) -> list[int]:
+        """Reserve a block of keys from a sequence."""
+        logger.debug("Reserving %s keys from %s.", self.block_size, sequence)
+        # nextval isn't transactional, so the keys stay reserved even if the
+        # transaction we're in is rolled back.
+        return list(
+            dst_conn.execute(
+                text("SELECT nextval(:sequence) FROM generate_series(1, :block_size)"),
+                {"sequence": sequence, "block_size": self.block_size},
+            ).scalars()
+        )
+
+    def fix_sequences(self, dst_conn: Connection, tables: Sequence[Table]) -> None:
+        """Make sure the sequences of `tables` are past their largest primary keys.
+
+        Keys taken with `allocate` always are, but rows may also have been written with
+        primary keys chosen some other way, for instance by a story generator.
+        """
+        for table in tables:
+            sequence = self._sequence(dst_conn, table)
+            if sequence is None:
+                continue
+            (column,) = table.primary_key.columns
+            preparer = dst_conn.dialect.identifier_preparer
+            dst_conn.execute(
+                text(
+                    f"SELECT setval(:sequence, max_key) FROM "
+                    f"(SELECT MAX({preparer.quote(column.name)}) AS max_key "
+                    f"FROM {preparer.format_table(table)}) AS max_keys "
+                    f"WHERE max_key > (SELECT last_value FROM {sequence})"
+                ).bindparams(bindparam("sequence", sequence))
+            )
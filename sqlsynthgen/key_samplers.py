@@ -0,0 +1,664 @@
+"""Samplers of existing values of key columns, for generating foreign keys."""
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Mapping,
+    MutableSequence,
+    Optional,
+    Sequence,
+)
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import Column, Connection, Engine, Table, event, func, select
+from sqlalchemy.sql import functions
+
+
+class _PendingRows:
+    """What the samplers are to be told of the rows of an uncommitted transaction."""
+
+    def __init__(self) -> None:
+        """Initialise an empty _PendingRows."""
+        # Each sampler with the keys to add to it, or None if it is to be invalidated.
+        self.updates: list[tuple["KeySampler", Optional[list[Any]]]] = []
+        # The number of updates there were when each open savepoint was started.
+        self.savepoints: list[int] = []
+        # The tables that rows have been written to.
+        self.tables: set[Table] = set()
+
+
+# The uncommitted rows of each connection in a transaction.
+_pending_rows: "WeakKeyDictionary[Connection, _PendingRows]" = WeakKeyDictionary()
+_pending_rows_lock = threading.Lock()
+
+
+def _get_pending_rows(
+    dst_conn: Connection, create: bool = False
+) -> Optional[_PendingRows]:
+    """Return the uncommitted rows written on a connection, if there are any."""
+    with _pending_rows_lock:
+        if create:
+            return _pending_rows.setdefault(dst_conn, _PendingRows())
+        return _pending_rows.get(dst_conn)
+
+
+def _apply_updates(updates: Iterable[tuple["KeySampler", Optional[list[Any]]]]) -> None:
+    """Add keys to samplers, or invalidate those whose keys aren't known."""
+    for sampler, keys in updates:
+        if keys is None:
+            sampler.invalidate()
+        else:
+            sampler.add(keys)
+
+
+def _on_commit(dst_conn: Connection) -> None:
+    """Tell the samplers about the rows of a transaction, as it's committed."""
+    with _pending_rows_lock:
+        pending = _pending_rows.pop(dst_conn, None)
+    if pending is not None:
+        _apply_updates(pending.updates)
+
+
+def _on_rollback(dst_conn: Connection) -> None:
+    """Forget the rows of a transaction that has been rolled back."""
+    with _pending_rows_lock:
+        _pending_rows.pop(dst_conn, None)
+
+
+def _on_savepoint(dst_conn: Connection, _: Optional[str]) -> None:
+    """Mark where the rows written after a savepoint start."""
+    pending = _get_pending_rows(dst_conn, create=True)
+    assert pending is not None
+    pending.savepoints.append(len(pending.updates))
+
+
+def _on_rollback_savepoint(dst_conn: Connection, _: Optional[str], __: Any) -> None:
+    """Forget the rows written after a savepoint that has been rolled back to."""
+    pending = _get_pending_rows(dst_conn)
+    if pending is not None and pending.savepoints:
+        del pending.updates[pending.savepoints.pop() :]
+
+
+def _on_release_savepoint(dst_conn: Connection, _: Optional[str], __: Any) -> None:
+    """Keep the rows written after a savepoint that has been released."""
+    pending = _get_pending_rows(dst_conn)
+    if pending is not None and pending.savepoints:
+        pending.savepoints.pop()
+
+
+def _listen_for_transactions() -> None:
+    """Follow the transactions of all connections, to know when rows are committed."""
+    listeners: list[tuple[str, Callable[..., None]]] = [
+        ("commit", _on_commit),
+        ("rollback", _on_rollback),
+        ("savepoint", _on_savepoint),
+        ("rollback_savepoint", _on_rollback_savepoint),
+        ("release_savepoint", _on_release_savepoint),
+    ]
+    for name, listener in listeners:
+        if not event.contains(Engine, name, listener):
+            event.listen(Engine, name, listener)
+
+
+class KeySampler(ABC):  # pylint: disable=too-many-instance-attributes
+    """Abstract base class for samplers of the values of a column of a table.
+
+    A sampler keeps some state read from the database, such as the values themselves
+    or their range. It is read the first time a value is asked for, and again whenever
+    it has gone stale. It goes stale if rows are written to the table without the
+    values of the column being known, see `KeySamplerRegistry.record_inserted_rows`,
+    or, if a `max_age` is given, when it is older than that many seconds. The latter
+    catches rows written by other processes.
+
+    The state is shared by connections that may be in different transactions, so it
+    only ever holds committed rows. If the connection a sampler is asked for a value on
+    has uncommitted rows in the table, the state is read on a new connection instead.
+
+    The lock that guards the state is never held while the database is queried. With
+    use-asyncio, a query suspends the greenlet running it, and another task waiting
+    for the lock would block the event loop's thread, so the query would never finish.
+    The state is read into a local and swapped in under the lock instead, and values
+    written while it was being read are added to it.
+    """
+
+    def __init__(
+        self, table: Table, column_name: str, max_age: Optional[float] = None
+    ) -> None:
+        """Initialise a KeySampler.
+
+        Args:
+            table: The table to sample from.
+            column_name: The name of the column to sample values of.
+            max_age: If given, the number of seconds after which to read the state
+                from the database again.
+        """
+        self.table = table
+        self.column_name = column_name
+        # The names of all the columns a key is made of.
+        self.column_names: tuple[str, ...] = (column_name,)
+        self.max_age = max_age
+        self._loaded = False
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        # The number of reads of the state under way, the values added since the
+        # earliest of them started, and the number of times the state was invalidated.
+        self._loads_in_flight = 0
+        self._adds_while_loading: list[Sequence[Any]] = []
+        self._invalidations = 0
+
+    @property
+    def column(self) -> Column:
+        """The column to sample values of."""
+        return self.table.columns[self.column_name]
+
+    def _is_integer_column(self) -> bool:
+        """Return whether the values of the column are integers."""
+        try:
+            return issubclass(self.column.type.python_type, int)
+        except NotImplementedError:
+            return False
+
+    def key_of(self, row: Mapping[str, Any]) -> Any:
+        """Return the key of a row written to the table."""
+        return row[self.column_name]
+
+    @abstractmethod
+    def _load(self, dst_conn: Connection) -> Any:
+        """Read the state of the sampler from the database, and return it."""
+
+    @abstractmethod
+    def _set_state(self, state: Any) -> None:
+        """Replace the state of the sampler with one returned by `_load`."""
+
+    @abstractmethod
+    def _draw(self, dst_conn: Connection) -> Any:
+        """Return a random value of the column, or `None` if there are none.
+
+        This is called with the lock held, so mustn't query the database, see
+        `_look_up`.
+        """
+
+    def _look_up(self, dst_conn: Connection, drawn: Any) -> Any:
+        """Turn a value returned by `_draw` into a value of the column.
+
+        This is called without the lock held, so may query the database.
+        """
+        del dst_conn
+        return drawn
+
+    @abstractmethod
+    def _add(self, keys: Sequence[Any]) -> None:
+        """Update the state of the sampler with values just written to the table."""
+
+    def _is_stale(self) -> bool:
+        """Return whether the state needs reading from the database again."""
+        if not self._loaded:
+            return True
+        return (
+            self.max_age is not None
+            and time.monotonic() - self._loaded_at > self.max_age
+        )
+
+    def sample(self, dst_conn: Connection) -> Any:
+        """Return a random value of the column, or `None` if the table is empty."""
+        with self._lock:
+            stale = self._is_stale()
+        if stale:
+            self._reload(dst_conn)
+        with self._lock:
+            drawn = self._draw(dst_conn)
+        return self._look_up(dst_conn, drawn)
+
+    def _reload(self, dst_conn: Connection) -> None:
+        """Read the state from the database, without holding the lock while doing so."""
+        with self._lock:
+            self._loads_in_flight += 1
+            first_add = len(self._adds_while_loading)
+            invalidations = self._invalidations
+        state = None
+        try:
+            pending = _get_pending_rows(dst_conn)
+            if pending is not None and self.table in pending.tables:
+                with dst_conn.engine.connect() as load_conn:
+                    state = self._load(load_conn)
+            else:
+                state = self._load(dst_conn)
+        finally:
+            with self._lock:
+                self._loads_in_flight -= 1
+                added = self._adds_while_loading[first_add:]
+                if not self._loads_in_flight:
+                    self._adds_while_loading = []
+                if state is not None:
+                    self._set_state(state)
+                    for keys in added:
+                        self._add(keys)
+                    # Rows whose values weren't known may have been committed after
+                    # the state was read.
+                    self._loaded = self._invalidations == invalidations
+                    self._loaded_at = time.monotonic()
+
+    def add(self, keys: Iterable[Any]) -> None:
+        """Tell the sampler about values of the column just written to the table."""
+        with self._lock:
+            keys = [key for key in keys if key is not None]
+            if self._loaded:
+                self._add(keys)
+            if self._loads_in_flight:
+                self._adds_while_loading.append(keys)
+
+    def invalidate(self) -> None:
+        """Mark the state as stale, so that it is read again when next needed."""
+        with self._lock:
+            self._loaded = False
+            self._invalidations += 1
+
+
+class CachedKeySampler(KeySampler):
+    """Samples values of a column from a copy of all of them, held in memory.
+
+    Integer values are kept in an `array`, other values in a list. Either way, drawing
+    a value takes constant time.
+    """
+
+    def __init__(
+        self, table: Table, column_name: str, max_age: Optional[float] = None
+    ) -> None:
+        """Initialise a CachedKeySampler.
+
+        Args:
+            table: The table to sample from.
+            column_name: The name of the column to sample values of.
+            max_age: If given, the number of seconds after which to read the values
+                from the database again.
+        """
+        super().__init__(table, column_name, max_age)
+        self._keys: MutableSequence[Any] = []
+
+    def _load(self, dst_conn: Connection) -> MutableSequence[Any]:
+        """Read all the values of the column from the database."""
+        keys: MutableSequence[Any] = []
+        if self._is_integer_column():
+            keys = array("q")
+        keys.extend(
+            dst_conn.execute(
+                select(self.column).where(self.column.is_not(None))
+            ).scalars()
+        )
+        return keys
+
+    def _set_state(self, state: MutableSequence[Any]) -> None:
+        """Replace the copy of the values."""
+        self._keys = state
+
+    def _draw(self, dst_conn: Connection) -> Any:
+        """Return one of the values, picked at random."""
+        if not self._keys:
+            return None
+        return self._keys[random.randrange(len(self._keys))]
+
+    def _add(self, keys: Sequence[Any]) -> None:
+        """Add the values to the copy."""
+        self._keys.extend(keys)
+
+
+class CachedKeyTupleSampler(KeySampler):
+    """Samples combinations of values of several columns, held in memory.
+
+    For composite foreign keys, whose columns have to be sampled together from the same
+    row of the table they reference. Rows with a null in any of the columns are left
+    out, as a foreign key with a null in it doesn't reference anything.
+    """
+
+    def __init__(
+        self,
+        table: Table,
+        column_names: Sequence[str],
+        max_age: Optional[float] = None,
+    ) -> None:
+        """Initialise a CachedKeyTupleSampler.
+
+        Args:
+            table: The table to sample from.
+            column_names: The names of the columns to sample values of, in order.
+            max_age: If given, the number of seconds after which to read the values
+                from the database again.
+        """
+        super().__init__(table, column_names[0], max_age)
+        self.column_names = tuple(column_names)
+        self._keys: list[tuple[Any, ...]] = []
+
+    def key_of(self, row: Mapping[str, Any]) -> Optional[tuple[Any, ...]]:
+        """Return the values of the columns in a row, or `None` if any is null."""
+        key = tuple(row[name] for name in self.column_names)
+        return None if None in key else key
+
+    def _load(self, dst_conn: Connection) -> list[tuple[Any, ...]]:
+        """Read all the combinations of values of the columns from the database."""
+        columns = [self.table.columns[name] for name in self.column_names]
+        return [
+            tuple(row)
+            for row in dst_conn.execute(
+                select(*columns).where(*(column.is_not(None) for column in columns))
+            )
+        ]
+
+    def _set_state(self, state: list[tuple[Any, ...]]) -> None:
+        """Replace the copy of the combinations."""
+        self._keys = state
+
+    def _draw(self, dst_conn: Connection) -> Optional[tuple[Any, ...]]:
+        """Return one of the combinations, picked at random."""
+        if not self._keys:
+            return None
+        return self._keys[random.randrange(len(self._keys))]
+
+    def _add(self, keys: Sequence[Any]) -> None:
+        """Add the combinations to the copy."""
+        self._keys.extend(keys)
+
+
+class TableSampleKeySampler(KeySampler):
+    """Samples values of a column from a reservoir filled by `TABLESAMPLE SYSTEM`.
+
+    For tables too big to hold all the values of in memory. A reservoir of up to
+    `reservoir_size` values is filled from a `sample_percent` percent sample of the
+    pages of the table, which PostgreSQL reads without scanning the rest, and values
+    are drawn from it. Since a page sample is clustered, the reservoir is refilled from
+    a new sample every `reservoir_size` draws. Values written in the meantime replace
+    values in the reservoir at random, as in reservoir sampling.
+
+    If the sample comes back empty, as it may for small tables, or on databases without
+    `TABLESAMPLE`, the reservoir is filled with `ORDER BY random()` instead.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        table: Table,
+        column_name: str,
+        max_age: Optional[float] = None,
+        sample_percent: float = 1.0,
+        reservoir_size: int = 10000,
+    ) -> None:
+        """Initialise a TableSampleKeySampler.
+
+        Args:
+            table: The table to sample from.
+            column_name: The name of the column to sample values of.
+            max_age: If given, the number of seconds after which to refill the
+                reservoir, however few values have been drawn from it.
+            sample_percent: The percentage of the pages of the table to sample.
+            reservoir_size: The maximum number of values to hold in memory.
+        """
+        super().__init__(table, column_name, max_age)
+        self.sample_percent = sample_percent
+        self.reservoir_size = reservoir_size
+        self._reservoir: list[Any] = []
+        self._draws = 0
+        # The number of values the reservoir has been a sample of.
+        self._seen = 0
+
+    def _load(self, dst_conn: Connection) -> list[Any]:
+        """Read a new sample of the table to fill the reservoir with."""
+        query = select(self.column).where(self.column.is_not(None))
+        reservoir: list[Any] = []
+        if dst_conn.dialect.name == "postgresql":
+            sampled_table = self.table.tablesample(
+                func.system(self.sample_percent), name="sampled"
+            )
+            sampled_column = sampled_table.columns[self.column_name]
+            reservoir = list(
+                dst_conn.execute(
+                    select(sampled_column)
+                    .where(sampled_column.is_not(None))
+                    .limit(self.reservoir_size)
+                ).scalars()
+            )
+        if not reservoir:
+            reservoir = list(
+                dst_conn.execute(
+                    query.order_by(functions.random()).limit(self.reservoir_size)
+                ).scalars()
+            )
+        return reservoir
+
+    def _set_state(self, state: list[Any]) -> None:
+        """Refill the reservoir."""
+        self._reservoir = state
+        self._draws = 0
+        self._seen = len(self._reservoir)
+
+    def _is_stale(self) -> bool:
+        """Return whether the reservoir needs refilling."""
+        return super()._is_stale() or self._draws >= self.reservoir_size
+
+    def _draw(self, dst_conn: Connection) -> Any:
+        """Return one of the values in the reservoir, picked at random."""
+        self._draws += 1
+        if not self._reservoir:
+            return None
+        return self._reservoir[random.randrange(len(self._reservoir))]
+
+    def _add(self, keys: Sequence[Any]) -> None:
+        """Put the values in the reservoir, each replacing a random one if it's full."""
+        for key in keys:
+            self._seen += 1
+            if len(self._reservoir) < self.reservoir_size:
+                self._reservoir.append(key)
+            else:
+                index = random.randrange(self._seen)
+                if index < self.reservoir_size:
+                    self._reservoir[index] = key
+
+
+class KeyRangeSampler(KeySampler):
+    """Base class for samplers of integer columns that draw from their range."""
+
+    def __init__(
+        self, table: Table, column_name: str, max_age: Optional[float] = None
+    ) -> None:
+        """Initialise a KeyRangeSampler.
+
+        Args:
+            table: The table to sample from.
+            column_name: The name of the column to sample values of. It must hold
+                integers.
+            max_age: If given, the number of seconds after which to read the range of
+                the values from the database again.
+        """
+        super().__init__(table, column_name, max_age)
+        if not self._is_integer_column():
+            raise ValueError(
+                f"Can't sample {table.name}.{column_name} by range, "
+                "it isn't an integer column."
+            )
+        self._min_key: Optional[int] = None
+        self._max_key: Optional[int] = None
+
+    def _load(self, dst_conn: Connection) -> tuple[Optional[int], Optional[int]]:
+        """Read the smallest and largest values of the column."""
+        min_key, max_key = dst_conn.execute(
+            select(functions.min(self.column), functions.max(self.column))
+        ).one()
+        return min_key, max_key
+
+    def _set_state(self, state: tuple[Optional[int], Optional[int]]) -> None:
+        """Replace the range."""
+        self._min_key, self._max_key = state
+
+    def _add(self, keys: Sequence[Any]) -> None:
+        """Widen the range to cover the values."""
+        if not keys:
+            return
+        self._min_key = min(keys if self._min_key is None else [self._min_key, *keys])
+        self._max_key = max(keys if self._max_key is None else [self._max_key, *keys])
+
+
+class PrimaryKeyRangeSampler(KeyRangeSampler):
+    """Samples values of an integer key column by probing random points of its range.
+
+    A random integer between the smallest and largest values is drawn, and the first
+    value at or after it is looked up, which takes a single index lookup rather than a
+    scan. Values that come after a gap in the keys are proportionally more likely to be
+    drawn.
+    """
+
+    def _draw(self, dst_conn: Connection) -> Optional[int]:
+        """Return a random point of the range."""
+        if self._min_key is None or self._max_key is None:
+            return None
+        return random.randint(self._min_key, self._max_key)
+
+    def _look_up(self, dst_conn: Connection, drawn: Any) -> Any:
+        """Return the first value at or after the point of the range drawn."""
+        if drawn is None:
+            return None
+        probe = drawn
+        column = self.column
+        key = dst_conn.execute(
+            select(column).where(column >= probe).order_by(column).limit(1)
+        ).scalar()
+        if key is None:
+            # Rows at the top of the range have been deleted since it was read.
+            key = dst_conn.execute(
+                select(column).where(column < probe).order_by(column.desc()).limit(1)
+            ).scalar()
+        return key
+
+
+class DenseRangeKeySampler(KeyRangeSampler):
+    """Samples values of an integer key column assumed to have no gaps.
+
+    Values are drawn uniformly between the smallest and largest values, without
+    querying the database. This is only right if every value in between exists, as
+    with the serial keys of a table that rows have never been deleted from.
+    """
+
+    def _draw(self, dst_conn: Connection) -> Any:
+        """Return a random integer between the smallest and largest values."""
+        if self._min_key is None or self._max_key is None:
+            return None
+        return random.randint(self._min_key, self._max_key)
+
+
+KEY_SAMPLERS: Mapping[str, type[KeySampler]] = {
+    "cache": CachedKeySampler,
+    "tablesample": TableSampleKeySampler,
+    "pk_range": PrimaryKeyRangeSampler,
+    "dense_range": DenseRangeKeySampler,
+}
+
+
+class KeySamplerRegistry:
+    """The key samplers in use, shared by all the generators of a process.
+
+    Samplers are shared between all the callers sampling the same column of the same
+    `Table` with the same strategy, and are told about the rows written by
+    `create-data`, so that their state doesn't go stale.
+    """
+
+    def __init__(self) -> None:
+        """Initialise an empty KeySamplerRegistry."""
+        # The default max_age of new samplers.
+        self.max_age: Optional[float] = None
+        self._samplers: dict[Table, dict[tuple[Any, ...], KeySampler]] = {}
+        self._lock = threading.Lock()
+        _listen_for_transactions()
+
+    def get(
+        self,
+        table: Table,
+        column_name: str,
+        strategy: str = "cache",
+        **options: Any,
+    ) -> KeySampler:
+        """Return the sampler of a column, creating it if necessary.
+
+        Args:
+            table: The table to sample from.
+            column_name: The name of the column to sample values of.
+            strategy: One of the keys of `KEY_SAMPLERS`.
+            options: Keyword arguments for the sampler class of the strategy.
+        """
+        if strategy not in KEY_SAMPLERS:
+            raise ValueError(f'Unknown sampling strategy "{strategy}".')
+        key = (column_name, strategy, *sorted(options.items()))
+        with self._lock:
+            table_samplers = self._samplers.setdefault(table, {})
+            if key not in table_samplers:
+                options.setdefault("max_age", self.max_age)
+                table_samplers[key] = KEY_SAMPLERS[strategy](
+                    table, column_name, **options
+                )
+            return table_samplers[key]
+
+    def get_tuple(self, table: Table, column_names: Sequence[str]) -> KeySampler:
+        """Return the sampler of a combination of columns, creating it if necessary.
+
+        Args:
+            table: The table to sample from.
+            column_names: The names of the columns to sample values of, in order.
+        """
+        key = (tuple(column_names), "cache")
+        with self._lock:
+            table_samplers = self._samplers.setdefault(table, {})
+            if key not in table_samplers:
+                table_samplers[key] = CachedKeyTupleSampler(
+                    table, column_names, max_age=self.max_age
+                )
+            return table_samplers[key]
+
+    def record_inserted_rows(
+        self,
+        table: Table,
+        rows: Sequence[Mapping[str, Any]],
+        dst_conn: Optional[Connection] = None,
+    ) -> None:
+        """Tell the samplers of `table` about rows just written to it.
+
+        If all the rows have values for a sampler's columns, these are added to it.
+        Otherwise, for instance when the database assigns the primary keys, its state
+        is marked as stale. If the rows were written on `dst_conn` in a transaction,
+        this only happens when it's committed, and never if it's rolled back, as other
+        connections can't see the rows until then.
+        """
+        with self._lock:
+            samplers = list(self._samplers.get(table, {}).values())
+        updates: list[tuple[KeySampler, Optional[list[Any]]]] = []
+        for sampler in samplers:
+            if all(name in row for row in rows for name in sampler.column_names):
+                keys = [sampler.key_of(row) for row in rows]
+                updates.append((sampler, keys))
+            else:
+                updates.append((sampler, None))
+        if dst_conn is not None and dst_conn.in_transaction():
+            pending = _get_pending_rows(dst_conn, create=True)
+            assert pending is not None
+            pending.tables.add(table)
+            pending.updates += updates
+            return
+        _apply_updates(updates)
+
+    def invalidate(self) -> None:
+        """Mark the state of all samplers as stale, for instance after a rollback."""
+        with self._lock:
+            samplers = [
+                sampler
+                for table_samplers in self._samplers.values()
+                for sampler in table_samplers.values()
+            ]
+        for sampler in samplers:
+            sampler.invalidate()
+
+    def clear(self) -> None:
+        """Forget all samplers."""
+        with self._lock:
+            self._samplers.clear()
+
+
+key_sampler_registry = KeySamplerRegistry()
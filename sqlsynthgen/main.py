@@ -7,15 +7,23 @@ from pathlib import Path
 from types import ModuleType
 from typing import Final, Optional
 
-import yaml
 from jsonschema.exceptions import ValidationError
 from jsonschema.validators import validate
 from typer import Option, Typer
 
-from sqlsynthgen.create import create_db_data, create_db_tables, create_db_vocab
+from sqlsynthgen.create import (
+    create_db_data,
+    create_db_data_in_workers,
+    create_db_tables,
+    create_db_vocab,
+    finalise_db_tables,
+    seed_generators,
+)
 from sqlsynthgen.make import make_src_stats, make_table_generators, make_tables_file
 from sqlsynthgen.remove import remove_db_data, remove_db_tables, remove_db_vocab
+from sqlsynthgen.serialisation import load
 from sqlsynthgen.settings import Settings, get_settings
+from sqlsynthgen.src_stats import write_src_stats
 from sqlsynthgen.utils import (
     CONFIG_SCHEMA_PATH,
     conf_logger,
@@ -58,6 +66,8 @@ def create_data(
     ssg_file: str = Option(SSG_FILENAME),
     config_file: Optional[str] = Option(None),
     num_passes: int = Option(1),
+    workers: int = Option(1, min=1),
+    seed: Optional[int] = Option(None),
     verbose: bool = Option(False, "--verbose", "-v"),
 ) -> None:
     """Populate schema with synthetic data.
@@ -85,23 +95,37 @@ def create_data(
           Must be in the current working directory.
         config_file (str): Path to configuration file.
         num_passes (int): Number of passes to make.
+        workers (int): Number of processes to split the passes between.
+          Default to 1.
+        seed (int): Seed for the random number generators, for reproducible data.
+          Runs with parallel-tables set aren't reproducible, see seed_generators.
         verbose (bool): Be verbose. Default to False.
     """
     conf_logger(verbose)
     logger.debug("Creating data.")
-    orm_module = import_file(orm_file)
-    ssg_module = import_file(ssg_file)
     config = read_config_file(config_file) if config_file is not None else {}
-    tables_config = config.get("tables", {})
-    orm_metadata = get_orm_metadata(orm_module, tables_config)
-    table_generator_dict = ssg_module.table_generator_dict
-    story_generator_list = ssg_module.story_generator_list
-    row_counts = create_db_data(
-        orm_metadata.sorted_tables,
-        table_generator_dict,
-        story_generator_list,
-        num_passes,
-    )
+    if seed is not None and config.get("parallel-tables", 1) > 1:
+        logger.warning(
+            "Tables filled concurrently draw from shared random number generators, "
+            "so the data won't be reproducible with parallel-tables set."
+        )
+    if workers > 1:
+        row_counts = create_db_data_in_workers(
+            orm_file, ssg_file, config, num_passes, workers, seed
+        )
+    else:
+        orm_module = import_file(orm_file)
+        ssg_module = import_file(ssg_file)
+        if seed is not None:
+            seed_generators(ssg_module, str(seed))
+        orm_metadata = get_orm_metadata(orm_module, config.get("tables", {}))
+        row_counts = create_db_data(
+            orm_metadata.sorted_tables,
+            ssg_module.table_generator_dict,
+            ssg_module.story_generator_list,
+            num_passes,
+            config,
+        )
     logger.debug(
         "Data created in %s %s.", num_passes, "pass" if num_passes == 1 else "passes"
     )
@@ -141,6 +165,7 @@ def create_vocab(
 def create_tables(
     orm_file: str = Option(ORM_FILENAME),
     config_file: Optional[str] = Option(None),
+    bulk_load: bool = Option(False, "--bulk-load"),
     verbose: bool = Option(False, "--verbose", "-v"),
 ) -> None:
     """Create schema from a SQLAlchemy ORM file.
@@ -155,6 +180,8 @@ def create_tables(
         orm_file (str): Name of Python ORM file.
           Must be in the current working directory.
         config_file (str): Path to configuration file.
+        bulk_load (bool): Leave out indexes and foreign keys, to make loading
+          data faster. Run finalise-tables once the data is in. Default to False.
         verbose (bool): Be verbose. Default to False.
     """
     conf_logger(verbose)
@@ -163,10 +190,42 @@ def create_tables(
     tables_config = config.get("tables", {})
     orm_module = import_file(orm_file)
     orm_metadata = get_orm_metadata(orm_module, tables_config)
-    create_db_tables(orm_metadata)
+    create_db_tables(orm_metadata, bulk_load=bulk_load)
     logger.debug("Tables created.")
 
 
+@app.command()
+def finalise_tables(
+    orm_file: str = Option(ORM_FILENAME),
+    config_file: Optional[str] = Option(None),
+    workers: int = Option(4, min=1),
+    verbose: bool = Option(False, "--verbose", "-v"),
+) -> None:
+    """Add the indexes and foreign keys left out by create-tables --bulk-load.
+
+    Indexes are built concurrently, then foreign keys are added and
+    validated, and finally the tables are analysed.
+
+    Example:
+        $ sqlsynthgen finalise-tables
+
+    Args:
+        orm_file (str): Name of Python ORM file.
+          Must be in the current working directory.
+        config_file (str): Path to configuration file.
+        workers (int): Number of indexes to build at once. Default to 4.
+        verbose (bool): Be verbose. Default to False.
+    """
+    conf_logger(verbose)
+    logger.debug("Finalising tables.")
+    config = read_config_file(config_file) if config_file is not None else {}
+    tables_config = config.get("tables", {})
+    orm_module = import_file(orm_file)
+    orm_metadata = get_orm_metadata(orm_module, tables_config)
+    finalise_db_tables(orm_metadata, workers=workers)
+    logger.debug("Tables finalised.")
+
+
 @app.command()
 def make_generators(
     orm_file: str = Option(ORM_FILENAME),
@@ -223,7 +282,9 @@ def make_stats(
 ) -> None:
     """Compute summary statistics from the source database.
 
-    Writes the statistics to a YAML file.
+    Writes the statistics to a YAML file or, if the name of the file ends in .npz, to
+    an uncompressed file of NumPy arrays, which is much faster to load and can be
+    memory-mapped.
 
     Example:
         $ sqlsynthgen make_stats --config-file=example_config.yaml
@@ -243,7 +304,7 @@ def make_stats(
     src_stats = asyncio.get_event_loop().run_until_complete(
         make_src_stats(src_dsn, config, settings.src_schema)
     )
-    stats_file_path.write_text(yaml.dump(src_stats), encoding="utf-8")
+    write_src_stats(src_stats, stats_file_path)
     logger.debug("%s created.", stats_file)
 
 
@@ -294,7 +355,7 @@ def validate_config(
     conf_logger(verbose)
     logger.debug("Validating config file: %s.", config_file)
 
-    config = yaml.load(config_file.read_text(encoding="UTF-8"), Loader=yaml.SafeLoader)
+    config = load(config_file)
     schema_config = json.loads(CONFIG_SCHEMA_PATH.read_text(encoding="UTF-8"))
     try:
         validate(config, schema_config)
@@ -13,7 +13,7 @@ from black import FileMode, format_str
 from jinja2 import Environment, FileSystemLoader, Template
 from mimesis.providers.base import BaseProvider
 from sqlacodegen.generators import DeclarativeGenerator
-from sqlalchemy import Engine, MetaData, UniqueConstraint, text
+from sqlalchemy import Engine, ForeignKey, MetaData, UniqueConstraint, text
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy.schema import Column, Table
@@ -66,12 +66,15 @@ class RowGeneratorInfo:
 
 
 @dataclass
-class TableGeneratorInfo:
+class TableGeneratorInfo:  # pylint: disable=too-many-instance-attributes
     """Contains the ssg.py content related to regular tables."""
 
     class_name: str
     table_name: str
     rows_per_pass: int
+    insert_batch_size: Optional[int] = None
+    insert_strategy: Optional[str] = None
+    fan_out: Optional[FunctionCall] = None
     row_gens: list[RowGeneratorInfo] = field(default_factory=list)
     unique_constraints: list[UniqueConstraint] = field(default_factory=list)
 
@@ -153,10 +156,88 @@ def _get_row_generator(
     return row_gen_info, columns_covered
 
 
+def _foreign_key_target(tables_module: ModuleType, fkey: ForeignKey) -> Tuple[str, str]:
+    """Return the ORM class and the name of the column that a foreign key references.
+
+    The ORM class is qualified with the name of `tables_module`.
+    """
+    target_name_parts = fkey.target_fullname.split(".")
+    target_table_name = ".".join(target_name_parts[:-1])
+    target_column_name = target_name_parts[-1]
+    class_and_name = _orm_class_from_table_name(tables_module, target_table_name)
+    if not class_and_name:
+        raise ValueError(f"Could not find the ORM class for {target_table_name}.")
+
+    target_orm_class, _ = class_and_name
+    return f"{tables_module.__name__}.{target_orm_class}", target_column_name
+
+
+def _get_composite_foreign_key_generators(
+    tables_module: ModuleType, table: Table, columns_covered: list[str]
+) -> list[RowGeneratorInfo]:
+    """Get generators for the foreign keys of `table` made of several columns.
+
+    The columns of each are sampled together, from one row of the table it references,
+    so that together they reference a row that exists. Foreign keys that share columns
+    with `columns_covered`, or with each other, are left to the generators of their
+    columns. `columns_covered` is extended with the columns given generators here.
+    """
+    row_gens: list[RowGeneratorInfo] = []
+    constraints = sorted(
+        (
+            constraint
+            for constraint in table.foreign_key_constraints
+            if len(constraint.elements) > 1
+        ),
+        key=lambda constraint: (
+            constraint.name or "",
+            [element.parent.name for element in constraint.elements],
+        ),
+    )
+    for constraint in constraints:
+        column_names = [element.parent.name for element in constraint.elements]
+        overlap = set(column_names) & set(columns_covered)
+        if overlap:
+            if overlap != set(column_names):
+                logger.warning(
+                    "Some columns of the foreign key %s of %s already have "
+                    "generators, so its columns may not reference a single row.",
+                    column_names,
+                    table.name,
+                )
+            continue
+        targets = [
+            _foreign_key_target(tables_module, element)
+            for element in constraint.elements
+        ]
+        row_gens.append(
+            RowGeneratorInfo(
+                variable_names=column_names,
+                function_call=_get_function_call(
+                    function_name="generic.column_value_provider.column_values",
+                    positional_arguments=[
+                        "dst_db_conn",
+                        targets[0][0],
+                        repr([target_column for _, target_column in targets]),
+                    ],
+                ),
+            )
+        )
+        columns_covered.extend(column_names)
+    return row_gens
+
+
 def _get_default_generator(
-    tables_module: ModuleType, column: Column
+    tables_module: ModuleType,
+    column: Column,
+    foreign_key_sampling: Optional[Mapping[str, Any]] = None,
 ) -> RowGeneratorInfo:
-    """Get default generator information, for the given column."""
+    """Get default generator information, for the given column.
+
+    Foreign key columns are sampled from the column they reference with the strategy
+    set for them in `foreign_key_sampling`, which maps column names to the sampling
+    strategy and its options, or else from a cache of all its values.
+    """
     # If it's a primary key column, we presume that primary keys are populated
     # automatically.
 
@@ -165,29 +246,29 @@ def _get_default_generator(
     variable_names: list[str] = []
     generator_function: str = ""
     generator_arguments: list[str] = []
+    generator_keyword_arguments: dict[str, str] = {}
 
     if column.foreign_keys:
         if len(column.foreign_keys) > 1:
             raise NotImplementedError(
                 "Can't handle multiple foreign keys for one column."
             )
-        fkey = next(iter(column.foreign_keys))
-        target_name_parts = fkey.target_fullname.split(".")
-        target_table_name = ".".join(target_name_parts[:-1])
-        target_column_name = target_name_parts[-1]
-        class_and_name = _orm_class_from_table_name(tables_module, target_table_name)
-        if not class_and_name:
-            raise ValueError(f"Could not find the ORM class for {target_table_name}.")
-
-        target_orm_class, _ = class_and_name
-
+        target_orm_class, target_column_name = _foreign_key_target(
+            tables_module, next(iter(column.foreign_keys))
+        )
         variable_names = [column.name]
         generator_function = "generic.column_value_provider.column_value"
         generator_arguments = [
             "dst_db_conn",
-            f"{tables_module.__name__}.{target_orm_class}",
+            target_orm_class,
             f'"{target_column_name}"',
         ]
+        sampling = {"strategy": "cache"}
+        if foreign_key_sampling is not None and column.name in foreign_key_sampling:
+            sampling = foreign_key_sampling[column.name]
+        generator_keyword_arguments = {
+            key: repr(value) for key, value in sampling.items()
+        }
 
     # Otherwise generate values based on just the datatype of the column.
     else:
@@ -201,7 +282,9 @@ def _get_default_generator(
         primary_key=column.primary_key,
         variable_names=variable_names,
         function_call=_get_function_call(
-            function_name=generator_function, positional_arguments=generator_arguments
+            function_name=generator_function,
+            positional_arguments=generator_arguments,
+            keyword_arguments=generator_keyword_arguments,
         ),
     )
 
@@ -315,32 +398,88 @@ def _constraint_sort_key(constraint: UniqueConstraint) -> str:
     )
 
 
+def _get_fan_out(table_config: Mapping[str, Any]) -> Optional[FunctionCall]:
+    """Get the call that makes the `FanOut` of a table, if it has one."""
+    fan_out_config = table_config.get("fan_out")
+    if fan_out_config is None:
+        return None
+    foreign_key = repr(fan_out_config["foreign_key"])
+    if "src_stats_query" in fan_out_config:
+        return _get_function_call(
+            function_name="FanOut.from_src_stats",
+            positional_arguments=[
+                foreign_key,
+                f'SRC_STATS["{fan_out_config["src_stats_query"]}"]',
+            ],
+            keyword_arguments={
+                "count_column": repr(fan_out_config["count_column"]),
+                "weights_column": repr(fan_out_config["weights_column"]),
+            },
+        )
+    keyword_arguments = {"counts": repr(fan_out_config["counts"])}
+    if "weights" in fan_out_config:
+        keyword_arguments["weights"] = repr(fan_out_config["weights"])
+    return _get_function_call(
+        function_name="FanOut",
+        positional_arguments=[foreign_key],
+        keyword_arguments=keyword_arguments,
+    )
+
+
 def _get_generator_for_table(
-    tables_module: ModuleType, table_config: Mapping[str, Any], table: Table
+    tables_module: ModuleType,
+    table_config: Mapping[str, Any],
+    table: Table,
+    default_insert_batch_size: Optional[int] = None,
 ) -> TableGeneratorInfo:
-    """Get generator information for the given table."""
-    unique_constraints = sorted(
-        (
-            constraint
-            for constraint in table.constraints
-            if isinstance(constraint, UniqueConstraint)
-        ),
-        key=_constraint_sort_key,
-    )
+    """Get generator information for the given table.
+
+    `default_insert_batch_size` is used if `table_config` does not set its own
+    `insert_batch_size`. If neither is set, the generated class inherits the default of
+    `TableGenerator`.
+    """
+    if table_config.get("insert_strategy") == "on_conflict_do_nothing":
+        # The database skips rows that break unique constraints, so there's no need
+        # to wrap row generators in UniqueGenerators.
+        unique_constraints = []
+    else:
+        unique_constraints = sorted(
+            (
+                constraint
+                for constraint in table.constraints
+                if isinstance(constraint, UniqueConstraint)
+            ),
+            key=_constraint_sort_key,
+        )
     table_data: TableGeneratorInfo = TableGeneratorInfo(
         table_name=table.name,
         class_name=table.name + "Generator",
         rows_per_pass=table_config.get("num_rows_per_pass", 1),
+        insert_batch_size=table_config.get(
+            "insert_batch_size", default_insert_batch_size
+        ),
+        insert_strategy=table_config.get("insert_strategy"),
+        fan_out=_get_fan_out(table_config),
         unique_constraints=unique_constraints,
     )
 
     row_gen_info_data, columns_covered = _get_row_generator(table_config)
     table_data.row_gens.extend(row_gen_info_data)
+    if "fan_out" in table_config:
+        # The foreign key is set to the parent's key when the rows are generated.
+        columns_covered.append(table_config["fan_out"]["foreign_key"])
+    table_data.row_gens.extend(
+        _get_composite_foreign_key_generators(tables_module, table, columns_covered)
+    )
 
     for column in table.columns:
         if column.name not in columns_covered:
             # No generator for this column in the user config.
-            table_data.row_gens.append(_get_default_generator(tables_module, column))
+            table_data.row_gens.append(
+                _get_default_generator(
+                    tables_module, column, table_config.get("foreign_key_sampling")
+                )
+            )
 
     _enforce_unique_constraints(table_data)
     return table_data
@@ -391,6 +530,7 @@ def make_table_generators(  # pylint: disable=too-many-locals
     assert src_dsn != "", "Missing SRC_DSN setting."
 
     tables_config = config.get("tables", {})
+    insert_batch_size: Optional[int] = config.get("insert-batch-size", None)
     metadata = get_orm_metadata(tables_module, tables_config)
     engine = get_sync_engine(create_db_engine(src_dsn, schema_name=settings.src_schema))
 
@@ -406,7 +546,11 @@ def make_table_generators(  # pylint: disable=too-many-locals
                 )
             )
         else:
-            tables.append(_get_generator_for_table(tables_module, table_config, table))
+            tables.append(
+                _get_generator_for_table(
+                    tables_module, table_config, table, insert_batch_size
+                )
+            )
 
     story_generators = _get_story_generators(config)
 
@@ -0,0 +1,187 @@
+"""Pipelined writing of generated rows to the destination database."""
+import queue
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Optional
+
+from sqlalchemy import Connection, Engine
+from sqlalchemy.schema import Table
+
+from sqlsynthgen.utils import logger
+
+# A function that writes rows to a table and returns how many it wrote.
+InsertFunction = Callable[[Table, list[dict[str, Any]], Connection], int]
+
+
+@dataclass
+class _Batch:
+    """Rows waiting to be written to a table."""
+
+    table: Table
+    rows: list[dict[str, Any]]
+    insert_function: InsertFunction
+
+
+@dataclass
+class PipelineStats:
+    """Statistics on how busy the two sides of a `RowWriterPipeline` were."""
+
+    batches: int = 0
+    # The sum of the queue depths seen when each batch was queued.
+    total_queue_depth: int = 0
+    max_queue_depth: int = 0
+    # Seconds spent by the generating thread waiting for space in the queue.
+    producer_stall: float = 0.0
+    # Seconds spent by the writer threads waiting for batches, summed over threads.
+    writer_stall: float = 0.0
+
+    @property
+    def mean_queue_depth(self) -> float:
+        """The mean number of batches in the queue when a batch was queued."""
+        return self.total_queue_depth / self.batches if self.batches else 0.0
+
+
+class RowWriterPipeline:  # pylint: disable=too-many-instance-attributes
+    """Write batches of generated rows to the database from writer threads.
+
+    Batches are put on a bounded queue, which writer threads drain, each on its own
+    connection and each batch in its own transaction. Putting a batch on a full queue
+    blocks until a writer makes space for it, so generation can only get
+    `queue_size` batches ahead of the database.
+
+    Errors in the writer threads are raised in the generating thread by the next call
+    to `put`, `wait_for`, `wait_for_all` or `close`. Batches queued after an error are
+    discarded. The rows written, which some insert strategies may skip some of, are
+    counted in `row_counts`.
+    """
+
+    def __init__(self, dst_engine: Engine, writers: int, queue_size: int) -> None:
+        """Initialise a RowWriterPipeline and start its writer threads.
+
+        Args:
+            dst_engine: The engine to open the writers' connections with.
+            writers: The number of writer threads.
+            queue_size: The maximum number of batches waiting to be written.
+        """
+        self.stats = PipelineStats()
+        # The number of rows written, as the insert functions count them, by table name.
+        self.row_counts: Counter[str] = Counter()
+        self._queue: queue.Queue[Optional[_Batch]] = queue.Queue(maxsize=queue_size)
+        self._dst_engine = dst_engine
+        # The number of batches queued but not yet written, by table full name.
+        self._pending: Counter[str] = Counter()
+        self._condition = threading.Condition()
+        self._error: Optional[Exception] = None
+        self._threads = [
+            threading.Thread(target=self._write, name=f"ssg-writer-{i}", daemon=True)
+            for i in range(writers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def put(
+        self,
+        table: Table,
+        rows: list[dict[str, Any]],
+        insert_function: InsertFunction,
+    ) -> None:
+        """Queue rows to be written to `table` with `insert_function`."""
+        self._raise_error()
+        with self._condition:
+            self._pending[table.fullname] += 1
+        queue_depth = self._queue.qsize()
+        self.stats.batches += 1
+        self.stats.total_queue_depth += queue_depth
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, queue_depth)
+        start = time.perf_counter()
+        self._queue.put(_Batch(table, rows, insert_function))
+        self.stats.producer_stall += time.perf_counter() - start
+
+    def wait_for(self, table_names: Iterable[str]) -> None:
+        """Block until the queued rows of the named tables are written."""
+        table_names = list(table_names)
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._error is not None
+                or all(self._pending[name] == 0 for name in table_names)
+            )
+        self._raise_error()
+
+    def wait_for_all(self) -> None:
+        """Block until all the queued rows are written."""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._error is not None or not any(self._pending.values())
+            )
+        self._raise_error()
+
+    def close(self) -> None:
+        """Write the remaining rows, stop the writer threads and log the statistics."""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        logger.info(
+            "Wrote %s %s through the pipeline. Queue depth: mean %.1f, max %s of %s. "
+            "Generation waited %.2fs for the writers, "
+            "writers waited %.2fs for generation.",
+            self.stats.batches,
+            "batch" if self.stats.batches == 1 else "batches",
+            self.stats.mean_queue_depth,
+            self.stats.max_queue_depth,
+            self._queue.maxsize,
+            self.stats.producer_stall,
+            self.stats.writer_stall,
+        )
+        self._raise_error()
+
+    def _raise_error(self) -> None:
+        """Raise the first error that happened in a writer thread, if any."""
+        if self._error is not None:
+            raise self._error
+
+    def _fail(self, error: Exception) -> None:
+        """Record an error from a writer thread."""
+        with self._condition:
+            if self._error is None:
+                self._error = error
+            self._condition.notify_all()
+
+    def _write(self) -> None:
+        """Write batches from the queue until told to stop. Run by each writer thread."""
+        try:
+            dst_conn = self._dst_engine.connect()
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self._fail(e)
+            # Keep emptying the queue, so that the generating thread doesn't block.
+            self._drain(None)
+            return
+        with dst_conn:
+            self._drain(dst_conn)
+
+    def _drain(self, dst_conn: Optional[Connection]) -> None:
+        """Take batches off the queue and write them, until a `None` comes off."""
+        while True:
+            start = time.perf_counter()
+            batch = self._queue.get()
+            stall = time.perf_counter() - start
+            with self._condition:
+                self.stats.writer_stall += stall
+            if batch is None:
+                return
+            try:
+                if dst_conn is not None and self._error is None:
+                    with dst_conn.begin():
+                        num_rows = batch.insert_function(
+                            batch.table, batch.rows, dst_conn
+                        )
+                    with self._condition:
+                        self.row_counts[batch.table.name] += num_rows
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self._fail(e)
+            finally:
+                with self._condition:
+                    self._pending[batch.table.fullname] -= 1
+                    self._condition.notify_all()
@@ -1,13 +1,34 @@
 """This module contains Mimesis Provider sub-classes."""
+import builtins
 import datetime as dt
 import random
-from typing import Any, Optional, Union, cast
-
+import string
+import threading
+from bisect import bisect
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from itertools import accumulate
+from typing import Any, Optional, Sequence, Union, cast
+
+import numpy as np
 from mimesis import Datetime, Text
 from mimesis.providers.base import BaseDataProvider, BaseProvider
-from sqlalchemy import Connection
+from sqlalchemy import Connection, Table
 from sqlalchemy.sql import functions, select
 
+from sqlsynthgen.key_samplers import key_sampler_registry
+from sqlsynthgen.src_stats import ColumnarResult
+from sqlsynthgen.unique_generator import PermutedSequence
+
+# The most query results, weights columns and sets of filter columns that an
+# SQLGroupByProvider keeps the partitioned rows of.
+_MAX_PARTITIONS = 64
+
+
+def _table_of(orm_class: Any) -> Table:
+    """Return the table of an ORM class, or the table itself for a Core table."""
+    return cast(Table, getattr(orm_class, "__table__", orm_class))
+
 
 class ColumnValueProvider(BaseProvider):
     """A Mimesis provider of random values from the source database."""
@@ -19,9 +40,33 @@ class ColumnValueProvider(BaseProvider):
 
     @staticmethod
     def column_value(
-        db_connection: Connection, orm_class: Any, column_name: str
+        db_connection: Connection,
+        orm_class: Any,
+        column_name: str,
+        strategy: str = "random",
+        **options: Any,
     ) -> Any:
-        """Return a random value from the column specified."""
+        """Return a random value from the column specified.
+
+        Args:
+            db_connection: A connection to the database to sample from.
+            orm_class: The ORM class of the table to sample from.
+            column_name: The name of the column to sample values of.
+            strategy: How to sample. "random" queries the database for a random row
+                every time. The others are the keys of `KEY_SAMPLERS`: "cache" samples
+                from a copy of all the values of the column held in memory,
+                "tablesample" from a reservoir filled by `TABLESAMPLE SYSTEM`,
+                "pk_range" by probing random points of the range of an integer column,
+                and "dense_range" by drawing integers in that range without checking
+                that they exist.
+            options: Keyword arguments for the sampler of the strategy, for instance
+                `sample_percent` and `reservoir_size` for "tablesample".
+        """
+        if strategy != "random":
+            sampler = key_sampler_registry.get(
+                _table_of(orm_class), column_name, strategy, **options
+            )
+            return sampler.sample(db_connection)
         query = select(orm_class).order_by(functions.random()).limit(1)
         random_row = db_connection.execute(query).first()
 
@@ -29,6 +74,31 @@ class ColumnValueProvider(BaseProvider):
             return getattr(random_row, column_name)
         return None
 
+    @staticmethod
+    def column_values(
+        db_connection: Connection, orm_class: Any, column_names: list[str]
+    ) -> tuple[Any, ...]:
+        """Return the values of several columns from the same random row.
+
+        For composite foreign keys, whose values have to come from one row of the table
+        they reference. Rows are sampled from a cache of the values of the columns in
+        all the rows of the table.
+
+        Args:
+            db_connection: A connection to the database to sample from.
+            orm_class: The ORM class of the table to sample from.
+            column_names: The names of the columns to sample values of.
+
+        Returns:
+            The values of the columns, in the order of `column_names`, or all `None`s
+            if the table has no rows without nulls in them.
+        """
+        sampler = key_sampler_registry.get_tuple(_table_of(orm_class), column_names)
+        key = sampler.sample(db_connection)
+        if key is None:
+            return (None,) * len(column_names)
+        return cast(tuple[Any, ...], key)
+
 
 class BytesProvider(BaseDataProvider):
     """A Mimesis provider of binary data."""
@@ -103,6 +173,168 @@ class WeightedBooleanProvider(BaseProvider):
         """Return True with given `probability`, otherwise False."""
         return self.random.uniform(0, 1) < probability
 
+    def bool_many(self, probability: float, n: int) -> list[builtins.bool]:
+        """Return `n` booleans, each True with given `probability`, drawn at once."""
+        rng = np.random.default_rng(self.random.getrandbits(64))
+        return cast(list[builtins.bool], (rng.random(n) < probability).tolist())
+
+
+@dataclass
+class _WeightedRows:
+    """Rows of a `GROUP BY` query result, ready for weighted sampling.
+
+    The cumulative weights are computed once, so that each draw is a binary search
+    rather than the pass over all the rows that `random.choices` makes. The rows of a
+    `ColumnarResult` are referred to by their indices in it, so that their values stay
+    in its arrays until they are drawn.
+    """
+
+    rows: Sequence[dict[str, Any]]
+    cumulative_weights: Sequence[Any]
+    # The indices in rows of the rows to sample from, if not all of them.
+    indices: Optional[np.ndarray] = None
+    # NumPy copies of the cumulative weights and of the columns, made when first
+    # drawn from by draw_many.
+    _cumulative_array: Optional[np.ndarray] = field(
+        default=None, init=False, repr=False
+    )
+    _column_arrays: dict[str, np.ndarray] = field(
+        default_factory=dict, init=False, repr=False
+    )
+
+    @classmethod
+    def compile(
+        cls, rows: Sequence[dict[str, Any]], weights_column: str
+    ) -> "_WeightedRows":
+        """Compute the cumulative weights of `rows`. Negative weights count as 1."""
+        weights = (cast(int, row[weights_column]) for row in rows)
+        return cls(rows, list(accumulate(w if w >= 0 else 1 for w in weights)))
+
+    @classmethod
+    def compile_columns(
+        cls, result: ColumnarResult, weights_column: str, indices: np.ndarray
+    ) -> "_WeightedRows":
+        """Compute the cumulative weights of the rows of `result` at `indices`."""
+        weights = result.columns[weights_column][indices]
+        return cls(result, np.cumsum(np.where(weights >= 0, weights, 1)), indices)
+
+    def _row_index(self, position: int) -> int:
+        """Return the index in `rows` of the row at a position of the weights."""
+        return position if self.indices is None else int(self.indices[position])
+
+    def draw(self) -> dict[str, Any]:
+        """Return a random row, with probability proportional to its weight."""
+        total = self.cumulative_weights[-1]
+        if total <= 0:
+            raise ValueError("Total of weights must be greater than zero")
+        # The same draw that random.choices makes, given the cumulative weights.
+        position = bisect(
+            self.cumulative_weights,
+            random.random() * total,
+            0,
+            len(self.cumulative_weights) - 1,
+        )
+        return self.rows[self._row_index(position)]
+
+    def draw_many(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        """Return the indices in `rows` of `n` random rows, drawn with replacement."""
+        if self._cumulative_array is None:
+            self._cumulative_array = np.asarray(self.cumulative_weights, dtype=float)
+        total = self.cumulative_weights[-1]
+        if total <= 0:
+            raise ValueError("Total of weights must be greater than zero")
+        positions = np.searchsorted(
+            self._cumulative_array, rng.random(n) * total, side="right"
+        )
+        positions = np.minimum(positions, len(self.cumulative_weights) - 1)
+        return cast(
+            np.ndarray, positions if self.indices is None else self.indices[positions]
+        )
+
+    def column(self, name: str) -> np.ndarray:
+        """Return the values of a column of `rows`, as an array."""
+        if isinstance(self.rows, ColumnarResult):
+            return self.rows.columns[name]
+        if name not in self._column_arrays:
+            self._column_arrays[name] = np.fromiter(
+                (row[name] for row in self.rows), dtype=object, count=len(self.rows)
+            )
+        return self._column_arrays[name]
+
+
+def _filter_rows(
+    group_by_result: Sequence[dict[str, Any]],
+    weights_column: str,
+    filter_dict: Optional[dict[str, Any]],
+) -> _WeightedRows:
+    """Return the rows of `group_by_result` that match `filter_dict`, compiled."""
+    rows = group_by_result
+    if filter_dict is not None:
+
+        def filter_func(row: dict) -> bool:
+            for key, value in filter_dict.items():
+                if row[key] != value:
+                    return False
+            return True
+
+        rows = [row for row in group_by_result if filter_func(row)]
+        if not rows:
+            raise ValueError("No group_by_result left after filter")
+    return _WeightedRows.compile(rows, weights_column)
+
+
+def _partition_rows(
+    group_by_result: Sequence[dict[str, Any]],
+    weights_column: str,
+    filter_columns: tuple[str, ...],
+) -> Optional[dict[tuple[Any, ...], _WeightedRows]]:
+    """Partition the rows of `group_by_result` by the values of `filter_columns`.
+
+    Returns:
+        The rows of each partition, compiled, by the values of the filter columns in
+        them, or `None` if those values can't be hashed.
+    """
+    if isinstance(group_by_result, ColumnarResult):
+        return _partition_columns(group_by_result, weights_column, filter_columns)
+    partitions: dict[tuple[Any, ...], list[dict[str, Any]]] = {}
+    try:
+        for row in group_by_result:
+            values = tuple(row[column] for column in filter_columns)
+            partitions.setdefault(values, []).append(row)
+    except TypeError:
+        return None
+    return {
+        values: _WeightedRows.compile(rows, weights_column)
+        for values, rows in partitions.items()
+    }
+
+
+def _partition_columns(
+    result: ColumnarResult, weights_column: str, filter_columns: tuple[str, ...]
+) -> Optional[dict[tuple[Any, ...], _WeightedRows]]:
+    """Partition the rows of `result` by the values of `filter_columns`, by index.
+
+    Like `_partition_rows`, but the partitions hold the indices of their rows in
+    `result` rather than the rows, so that the values stay in its arrays.
+    """
+    if not filter_columns:
+        return {
+            (): _WeightedRows.compile_columns(
+                result, weights_column, np.arange(len(result))
+            )
+        }
+    partitions: dict[tuple[Any, ...], list[int]] = {}
+    filter_values = zip(*(result.columns[column].tolist() for column in filter_columns))
+    try:
+        for index, values in enumerate(filter_values):
+            partitions.setdefault(values, []).append(index)
+    except TypeError:
+        return None
+    return {
+        values: _WeightedRows.compile_columns(result, weights_column, np.array(indices))
+        for values, indices in partitions.items()
+    }
+
 
 class SQLGroupByProvider(BaseProvider):
     """A Mimesis provider that samples from the results of a SQL `GROUP BY` query."""
@@ -112,9 +344,60 @@ class SQLGroupByProvider(BaseProvider):
 
         name = "sql_group_by_provider"
 
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Initialise an SQLGroupByProvider."""
+        super().__init__(*args, **kwargs)
+        # Hash indexes of the query results most recently sampled from: the rows
+        # partitioned by the values of the columns filtered on, by the id of the query
+        # result, the weights column and the names of the columns filtered on, least
+        # recently used first. The query result is kept alongside, so that its id
+        # isn't reused while the entry is there.
+        self._partitions: OrderedDict[
+            tuple[int, str, tuple[str, ...]],
+            tuple[
+                Sequence[dict[str, Any]],
+                Optional[dict[tuple[Any, ...], _WeightedRows]],
+            ],
+        ] = OrderedDict()
+
+    def _get_weighted_rows(
+        self,
+        group_by_result: Sequence[dict[str, Any]],
+        weights_column: str,
+        filter_dict: Optional[dict[str, Any]],
+    ) -> _WeightedRows:
+        """Return the rows to sample from, looked up in a hash index if possible."""
+        filter_dict = filter_dict or {}
+        filter_columns = tuple(sorted(filter_dict))
+        key = (id(group_by_result), weights_column, filter_columns)
+        if key in self._partitions:
+            self._partitions.move_to_end(key)
+        else:
+            self._partitions[key] = (
+                group_by_result,
+                _partition_rows(group_by_result, weights_column, filter_columns),
+            )
+            if len(self._partitions) > _MAX_PARTITIONS:
+                # Results made afresh for each call would otherwise pile up.
+                self._partitions.popitem(last=False)
+        partitions = self._partitions[key][1]
+        if partitions is not None:
+            try:
+                weighted_rows = partitions.get(
+                    tuple(filter_dict[column] for column in filter_columns)
+                )
+            except TypeError:
+                # Unhashable filter values, so we have to look through all the rows.
+                pass
+            else:
+                if weighted_rows is None:
+                    raise ValueError("No group_by_result left after filter")
+                return weighted_rows
+        return _filter_rows(group_by_result, weights_column, filter_dict)
+
     def sample(
         self,
-        group_by_result: list[dict[str, Any]],
+        group_by_result: Sequence[dict[str, Any]],
         weights_column: str,
         value_columns: Optional[Union[str, list[str]]] = None,
         filter_dict: Optional[dict[str, Any]] = None,
@@ -158,27 +441,23 @@ class SQLGroupByProvider(BaseProvider):
             filter_dict: Dictionary of `{name_of_column: value_it_must_have}`, to
                 restrict the sampling to a subset of `group_by_result`. Optional.
 
+        The first time `group_by_result` is sampled from with a given `weights_column`
+        and set of columns in `filter_dict`, its rows are partitioned by the values of
+        those columns, and the weights of each partition added up. After that, each
+        sample takes a dictionary lookup and a time logarithmic in the number of rows of
+        the partition. `group_by_result` must therefore not be changed after it is first
+        sampled from. Only the partitions of the most recently sampled results are
+        kept, so a result made afresh for each call is partitioned each time.
+
         Returns:
             * a single value if `value_columns` is a single column name,
             * a tuple of values in the same order as `value_columns` if `value_columns`
               is an iterable of strings.
             * a dictionary of {name_of_column: value} if `value_columns` is `None`
         """
-        if filter_dict is not None:
-
-            def filter_func(row: dict) -> bool:
-                for key, value in filter_dict.items():
-                    if row[key] != value:
-                        return False
-                return True
-
-            group_by_result = [row for row in group_by_result if filter_func(row)]
-            if not group_by_result:
-                raise ValueError("No group_by_result left after filter")
-
-        weights = [cast(int, row[weights_column]) for row in group_by_result]
-        weights = [w if w >= 0 else 1 for w in weights]
-        random_choice = random.choices(group_by_result, weights)[0]
+        random_choice = self._get_weighted_rows(
+            group_by_result, weights_column, filter_dict
+        ).draw()
         if isinstance(value_columns, str):
             return random_choice[value_columns]
         if value_columns is not None:
@@ -186,6 +465,118 @@ class SQLGroupByProvider(BaseProvider):
             return values
         return random_choice
 
+    def sample_many(  # pylint: disable=too-many-arguments
+        self,
+        n: int,
+        group_by_result: Sequence[dict[str, Any]],
+        weights_column: str,
+        value_columns: Optional[Union[str, list[str]]] = None,
+        filter_dict: Optional[dict[str, Any]] = None,
+    ) -> Union[list[Any], dict[str, list[Any]], tuple[list[Any], ...]]:
+        """Random sample `n` rows from the result of a SQL `GROUP BY` query at once.
+
+        Like `sample`, but the rows are drawn together with NumPy, and returned by
+        column rather than by row, which is much faster than calling `sample` `n`
+        times. For example,
+
+        .. code-block:: python
+
+          genders, nationalities = generic.sql_group_by_provider.sample_many(
+              1000,
+              SRC_STATS["count_demographics"],
+              weights_column="num",
+              value_columns=["gender", "nationality"],
+          )
+
+        gives two lists of 1000 values, the gender and nationality of each row in
+        the same positions.
+
+        Arguments:
+            n: The number of rows to sample, with replacement.
+            group_by_result: As for `sample`.
+            weights_column: As for `sample`.
+            value_columns: As for `sample`.
+            filter_dict: As for `sample`.
+
+        Returns:
+            * a list of values if `value_columns` is a single column name,
+            * a tuple of lists of values in the same order as `value_columns` if
+              `value_columns` is an iterable of strings,
+            * a dictionary of {name_of_column: list_of_values} if `value_columns` is
+              `None`.
+        """
+        weighted_rows = self._get_weighted_rows(
+            group_by_result, weights_column, filter_dict
+        )
+        rng = np.random.default_rng(random.getrandbits(64))
+        indices = weighted_rows.draw_many(rng, n)
+
+        def column_values(name: str) -> list[Any]:
+            return cast(list[Any], weighted_rows.column(name)[indices].tolist())
+
+        if isinstance(value_columns, str):
+            return column_values(value_columns)
+        if value_columns is not None:
+            return tuple(column_values(col) for col in value_columns)
+        return {col: column_values(col) for col in weighted_rows.rows[0]}
+
+
+class UniquePermutationProvider(BaseProvider):
+    """A Mimesis provider of values that are unique by construction.
+
+    Each value is the next of a `PermutedSequence` of the possible values, so no value
+    is made twice in a run of create-data, in any thread or worker process, and each
+    costs the same however few values are left. The sequences are shared by all the
+    providers, and there is one for each set of arguments, so two columns given the
+    same arguments share their values between them.
+
+    A second run with the same arguments makes the same values again, so pass `start`
+    the number of values made before, or a different `key`.
+    """
+
+    class Meta:
+        """Meta-class for UniquePermutationProvider settings."""
+
+        name = "unique_permutation_provider"
+
+    _sequences: dict[tuple, PermutedSequence] = {}
+    _sequences_lock = threading.Lock()
+
+    @classmethod
+    def _sequence(cls, size: int, key: int, start: int, *domain: Any) -> int:
+        """Return the next integer of the sequence for the given arguments."""
+        with cls._sequences_lock:
+            sequence = cls._sequences.get((size, key, start, *domain))
+            if sequence is None:
+                sequence = PermutedSequence(size, key, start)
+                cls._sequences[(size, key, start, *domain)] = sequence
+        return sequence()
+
+    def integer(self, low: int, high: int, key: int = 0, start: int = 0) -> int:
+        """Return an integer from `low` to `high`, inclusive, not returned before."""
+        return low + self._sequence(high - low + 1, key, start, "integer", low)
+
+    def string(  # pylint: disable=too-many-arguments
+        self,
+        length: int,
+        alphabet: str = string.ascii_uppercase + string.digits,
+        prefix: str = "",
+        key: int = 0,
+        start: int = 0,
+    ) -> str:
+        """Return `prefix` and `length` characters of `alphabet`, not returned before.
+
+        For example, `string(6, "0123456789", "MRN")` returns medical record numbers
+        from MRN000000 to MRN999999.
+        """
+        base = len(alphabet)
+        value = self._sequence(base**length, key, start, "string", alphabet, prefix)
+        characters = []
+        for _ in range(length):
+            value, digit = divmod(value, base)
+            characters.append(alphabet[digit])
+        return prefix + "".join(reversed(characters))
+
 
 class NullProvider(BaseProvider):
     """A Mimesis provider that always returns `None`."""
@@ -0,0 +1,119 @@
+"""Reading and writing the YAML, JSON and MessagePack files that sqlsynthgen uses.
+
+The format of a file is picked by the extension of its name: `.json` files are JSON,
+`.msgpack` files are MessagePack and all others are YAML. YAML is read and written with
+the libyaml C loaders and dumpers when PyYAML was built with them, which is many times
+faster than with the pure Python ones, and gives the same files. MessagePack needs the
+optional msgpack package.
+"""
+import json
+from pathlib import Path
+from typing import Any, Final, Union
+
+import yaml
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_SUFFIX: Final[str] = ".json"
+MSGPACK_SUFFIX: Final[str] = ".msgpack"
+
+# The extensions of the files that FileUploader looks for, in order.
+SUFFIXES: Final[tuple[str, ...]] = (".yaml", JSON_SUFFIX, MSGPACK_SUFFIX)
+
+# The C loaders and dumper are only there if PyYAML was built against libyaml.
+_SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_UnsafeLoader = getattr(yaml, "CUnsafeLoader", yaml.UnsafeLoader)
+_Dumper = getattr(yaml, "CDumper", yaml.Dumper)
+
+
+class SerialisationError(Exception):
+    """A file couldn't be read or written in the format of its extension."""
+
+
+def _check_msgpack() -> None:
+    """Raise a SerialisationError if msgpack isn't installed."""
+    if msgpack is None:
+        raise SerialisationError(
+            "Reading and writing .msgpack files needs the msgpack package, "
+            "which can be installed with pip install msgpack."
+        )
+
+
+def yaml_load(text: Union[str, bytes], unsafe: bool = False) -> Any:
+    """Parse YAML, with the C loader if there is one.
+
+    Args:
+        text: The YAML to parse.
+        unsafe: Whether to construct any Python object that the YAML names, such as
+            the decimals and dates in vocabulary files, rather than only the basic
+            YAML types. Only use this for files written by sqlsynthgen.
+    """
+    try:
+        return yaml.load(text, Loader=_UnsafeLoader if unsafe else _SafeLoader)
+    except yaml.YAMLError as e:
+        raise SerialisationError(str(e)) from e
+
+
+def yaml_dump(data: Any) -> str:
+    """Write data as YAML, with the C dumper if there is one."""
+    return yaml.dump(data, Dumper=_Dumper)
+
+
+def load(path: Union[str, Path], unsafe: bool = False) -> Any:
+    """Read a file in the format of its extension.
+
+    Args:
+        path: The path of a YAML, JSON or MessagePack file.
+        unsafe: For YAML files, whether to construct any Python object that the file
+            names, see `yaml_load`.
+
+    Raises:
+        SerialisationError: If the file can't be parsed, or is a MessagePack file and
+            msgpack isn't installed.
+    """
+    if isinstance(path, str):
+        path = Path(path)
+    if path.suffix == JSON_SUFFIX:
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except ValueError as e:
+            raise SerialisationError(str(e)) from e
+    if path.suffix == MSGPACK_SUFFIX:
+        _check_msgpack()
+        try:
+            return msgpack.unpackb(path.read_bytes(), timestamp=3)
+        except ValueError as e:
+            raise SerialisationError(str(e)) from e
+    return yaml_load(path.read_bytes(), unsafe=unsafe)
+
+
+def dump(data: Any, path: Union[str, Path]) -> None:
+    """Write data to a file in the format of its extension.
+
+    JSON and MessagePack only hold basic types, so data with values of other types,
+    such as dates in JSON or decimals in either, can only be written as YAML.
+
+    Raises:
+        SerialisationError: If the data can't be written in the format, or the file is
+            a MessagePack file and msgpack isn't installed.
+    """
+    if isinstance(path, str):
+        path = Path(path)
+    if path.suffix == JSON_SUFFIX:
+        try:
+            text = json.dumps(data)
+        except TypeError as e:
+            raise SerialisationError(str(e)) from e
+        path.write_text(text, encoding="utf-8")
+    elif path.suffix == MSGPACK_SUFFIX:
+        _check_msgpack()
+        try:
+            packed = msgpack.packb(data, datetime=True)
+        except (TypeError, ValueError) as e:
+            raise SerialisationError(str(e)) from e
+        path.write_bytes(packed)
+    else:
+        path.write_text(yaml_dump(data), encoding="utf-8")
@@ -0,0 +1,225 @@
+"""Reading and writing the src-stats files made by make-stats."""
+import json
+import struct
+import threading
+import zipfile
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional, Union, cast
+
+import numpy as np
+
+from sqlsynthgen import serialisation
+
+# The member of a .npz src-stats file that lists the queries and their columns.
+_INDEX_MEMBER = "index"
+
+# The Python types stored in NumPy arrays of their own dtype. Columns with values of
+# any other type, or of more than one type, are stored as arrays of objects.
+_NATIVE_TYPES = (bool, int, float, str)
+
+# How many times the total length of the strings of a column a fixed-width array of
+# them, padded to the longest, may be, see _column_array.
+_MAX_STRING_PADDING = 2
+
+# The size of the fixed part of a zip file's local file header, and the offset in it
+# of the lengths of the file name and the extra field.
+_LOCAL_HEADER_SIZE = 30
+_LOCAL_HEADER_LENGTHS_OFFSET = 26
+
+
+def _column_array(values: list[Any]) -> np.ndarray:
+    """Return the values of a column as compact an array as gives them back as is.
+
+    Strings are stored in a fixed-width array, which can be memory-mapped, only if
+    padding them all to the length of the longest doesn't take more than
+    `_MAX_STRING_PADDING` times the space of the strings themselves. Otherwise, they
+    are stored as an array of objects.
+    """
+    value_types = {type(value) for value in values}
+    if value_types == {str}:
+        total_length = sum(len(value) for value in values)
+        max_length = max(len(value) for value in values)
+        if max_length * len(values) > _MAX_STRING_PADDING * max(total_length, 1):
+            return np.fromiter(values, dtype=object, count=len(values))
+    if len(value_types) == 1 and value_types <= set(_NATIVE_TYPES):
+        try:
+            return np.array(values)
+        except OverflowError:
+            # Integers too big for int64.
+            pass
+    return np.fromiter(values, dtype=object, count=len(values))
+
+
+def write_src_stats(src_stats: Mapping[str, list[dict]], path: Path) -> None:
+    """Write the results of the src-stats queries to a file.
+
+    If the name of the file ends in `.npz`, the results are written column by column
+    as NumPy arrays, which are much faster to read than YAML. The arrays aren't
+    compressed, so that they can be memory-mapped, see `NpzSrcStats`. Otherwise they
+    are written in the format of the extension, see `serialisation.dump`.
+    """
+    if path.suffix != ".npz":
+        serialisation.dump(dict(src_stats), path)
+        return
+
+    index: dict[str, dict[str, Any]] = {}
+    arrays: dict[str, np.ndarray] = {}
+    for query_number, (name, result) in enumerate(src_stats.items()):
+        column_names = list(result[0]) if result else []
+        members = []
+        for column_number, column_name in enumerate(column_names):
+            member = f"query{query_number}_column{column_number}"
+            arrays[member] = _column_array([row[column_name] for row in result])
+            members.append(member)
+        index[name] = {"columns": column_names, "members": members}
+    arrays[_INDEX_MEMBER] = np.array(json.dumps(index))
+    with path.open("wb") as stats_file:
+        np.savez(stats_file, **arrays)
+
+
+def _map_member(
+    path: Path, zip_file: zipfile.ZipFile, member: str
+) -> Optional[np.ndarray]:
+    """Memory-map an array in a .npz file read-only, if it is stored uncompressed.
+
+    Returns:
+        The array, or `None` if it is compressed, empty or holds objects, and so has
+        to be read instead.
+    """
+    info = zip_file.getinfo(member + ".npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with path.open("rb") as npz_file:
+        npz_file.seek(info.header_offset + _LOCAL_HEADER_LENGTHS_OFFSET)
+        name_length, extra_length = struct.unpack("<HH", npz_file.read(4))
+        npz_file.seek(
+            info.header_offset + _LOCAL_HEADER_SIZE + name_length + extra_length
+        )
+        version = np.lib.format.read_magic(npz_file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(npz_file)
+        elif version == (2, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(npz_file)
+        else:
+            return None
+        offset = npz_file.tell()
+    if dtype.hasobject or 0 in shape:
+        return None
+    return np.memmap(
+        path,
+        dtype=dtype,
+        mode="r",
+        offset=offset,
+        shape=shape,
+        order="F" if fortran_order else "C",
+    )
+
+
+class ColumnarResult(Sequence[dict[str, Any]]):
+    """The result of a src-stats query, held as one array per column.
+
+    It can be used as the list of rows, each a dictionary, that a YAML src-stats file
+    gives, but rows are only made as they are looked up, so the values stay in the
+    arrays, which may be memory-mapped. `SQLGroupByProvider` samples from the arrays
+    directly.
+    """
+
+    def __init__(self, columns: Mapping[str, np.ndarray]) -> None:
+        """Initialise a ColumnarResult.
+
+        Args:
+            columns: An array of the values of each column, by column name. The
+                arrays must all be the same length.
+        """
+        self.columns = dict(columns)
+        self._num_rows = len(next(iter(self.columns.values()))) if columns else 0
+        # Functions to get values out of the columns as Python objects, not NumPy
+        # scalars. Object arrays already hold Python objects.
+        self._getters: dict[str, Callable[[int], Any]] = {}
+        for name, column in self.columns.items():
+            if column.dtype.hasobject:
+                self._getters[name] = column.__getitem__
+            else:
+                self._getters[name] = column.item
+
+    def __len__(self) -> int:
+        """Return the number of rows."""
+        return self._num_rows
+
+    def __getitem__(self, index: Any) -> Any:
+        """Return a row, or a list of rows for a slice."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._num_rows))]
+        if index < 0:
+            index += self._num_rows
+        if not 0 <= index < self._num_rows:
+            raise IndexError("Row index out of range")
+        return {name: getter(index) for name, getter in self._getters.items()}
+
+
+class NpzSrcStats(Mapping[str, ColumnarResult]):
+    """The results of the src-stats queries in a .npz file, read when first used.
+
+    Each result is read the first time it is looked up, so that loading `ssg.py`
+    doesn't wait for the results of queries it doesn't use. Columns of bools, numbers
+    and strings in files written by `write_src_stats` are memory-mapped read-only
+    rather than read, so worker processes that load the same file share a single copy
+    of them, in the operating system's page cache. Columns of other types are read
+    into each process.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        """Initialise an NpzSrcStats.
+
+        Args:
+            path: The path of a file written by `write_src_stats`.
+        """
+        self._path = Path(path)
+        # Columns of objects are pickled. The file is ours, so that is as safe as the
+        # yaml.unsafe_load of the YAML src-stats files.
+        self._npz_file = np.load(self._path, allow_pickle=True)
+        self._index: dict[str, dict[str, Any]] = json.loads(
+            self._npz_file[_INDEX_MEMBER].item()
+        )
+        self._results: dict[str, ColumnarResult] = {}
+        self._lock = threading.Lock()
+
+    def _column(self, member: str) -> np.ndarray:
+        """Map an array of the file, or read it if it can't be mapped."""
+        mapped = _map_member(self._path, self._npz_file.zip, member)
+        if mapped is None:
+            return cast(np.ndarray, self._npz_file[member])
+        return mapped
+
+    def __getitem__(self, name: str) -> ColumnarResult:
+        """Return the result of a query."""
+        with self._lock:
+            if name not in self._results:
+                entry = self._index[name]
+                self._results[name] = ColumnarResult(
+                    {
+                        column: self._column(member)
+                        for column, member in zip(entry["columns"], entry["members"])
+                    }
+                )
+            return self._results[name]
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the names of the queries."""
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        """Return the number of queries."""
+        return len(self._index)
+
+
+def load_src_stats(path: Union[str, Path]) -> Mapping[str, Sequence[dict[str, Any]]]:
+    """Load the results of the src-stats queries from a file written by make-stats.
+
+    .npz files are read lazily, see `NpzSrcStats`. Other files are read in the format
+    of their extension, see `serialisation.load`.
+    """
+    if Path(path).suffix == ".npz":
+        return NpzSrcStats(path)
+    return dict(serialisation.load(path, unsafe=True))
@@ -1,10 +1,210 @@
 """Module for the UniqueGenerator class."""
-from typing import Any, Callable, List, Optional, Set
+import itertools
+import threading
+from typing import Any, Callable, Iterable, List, Optional, Tuple
 
+import numpy as np
 import sqlalchemy as sqla
 
 from sqlsynthgen.utils import logger
 
+# The number of rows to read from the database at a time when scanning existing keys.
+_YIELD_PER = 10_000
+
+# The number of rounds of the Feistel networks of FeistelPermutation.
+_FEISTEL_ROUNDS = 4
+
+_MASK_64 = (1 << 64) - 1
+
+# The index of this process among the worker processes of create-data, and the number
+# of workers, see set_worker.
+_worker: Tuple[int, int] = (0, 1)
+
+# The smallest number of new fingerprints to hold in a set before they are merged into
+# the sorted array.
+_MIN_PENDING = 65_536
+
+
+class KeyFingerprints:
+    """A compact set of keys, held as 64-bit fingerprints.
+
+    Only the hash of each key is kept, in a sorted NumPy array, which takes 8 bytes per
+    key rather than the hundred or more of a tuple of values in a set. Keys added since
+    the last merge are held in a set of fingerprints, which is merged into the array
+    once it grows to an eighth of its size, so adding a key takes constant time on
+    average.
+
+    Two different keys can have the same fingerprint, in which case the second is
+    taken to be in the set already. For a UniqueGenerator that only means trying
+    another value, so no duplicate key is ever let through, but with 64-bit
+    fingerprints it is vanishingly rare in any case.
+    """
+
+    def __init__(self, keys: Iterable[Iterable[Any]] = ()) -> None:
+        """Initialise a KeyFingerprints.
+
+        Args:
+            keys: The keys to start with.
+        """
+        self._fingerprints = np.unique(
+            np.fromiter((hash(tuple(key)) for key in keys), dtype=np.int64)
+        )
+        self._pending: set[int] = set()
+
+    @classmethod
+    def from_fingerprints(cls, fingerprints: np.ndarray) -> "KeyFingerprints":
+        """Make a KeyFingerprints from the hashes of keys, in any order."""
+        key_fingerprints = cls()
+        key_fingerprints._fingerprints = np.unique(fingerprints)
+        return key_fingerprints
+
+    def __contains__(self, key: object) -> bool:
+        """Return whether a key, or one with the same fingerprint, is in the set."""
+        fingerprint = hash(key)
+        if fingerprint in self._pending:
+            return True
+        index = int(np.searchsorted(self._fingerprints, fingerprint))
+        return (
+            index < len(self._fingerprints)
+            and int(self._fingerprints[index]) == fingerprint
+        )
+
+    def __len__(self) -> int:
+        """Return the number of distinct fingerprints in the set."""
+        return len(self._fingerprints) + len(self._pending)
+
+    def add(self, key: tuple) -> None:
+        """Add a key to the set."""
+        if key in self:
+            return
+        self._pending.add(hash(key))
+        if len(self._pending) >= max(_MIN_PENDING, len(self._fingerprints) // 8):
+            self._merge()
+
+    def _merge(self) -> None:
+        """Merge the pending fingerprints into the sorted array."""
+        pending = np.fromiter(self._pending, dtype=np.int64, count=len(self._pending))
+        self._fingerprints = np.union1d(self._fingerprints, pending)
+        self._pending.clear()
+
+
+class ExistingKeyScan:
+    """Reads the existing keys of a table for all of its UniqueGenerators at once.
+
+    Each UniqueGenerator of the table registers the columns of its constraint, and the
+    first to ask for its existing keys reads the keys of all the constraints not yet
+    read with a single scan of the table. The rows are streamed from the database in
+    chunks, and hashed chunk by chunk, so they are never all in memory at once.
+
+    Batches generated concurrently share the UniqueGenerators, so the keys of a
+    constraint are handed out to everyone that asks for them as one KeyFingerprints.
+    Constraints being read are marked as such, so that they aren't read by a second
+    scan. The lock guarding the marks is never held while the table is read: with
+    use-asyncio, reading suspends the greenlet doing it, and a task waiting on the
+    lock would block the event loop's thread. So, rather than waiting for the scan
+    reading its keys, a caller reads them again on its own, and whichever scan ends
+    first provides the keys for everyone.
+    """
+
+    def __init__(self, table_name: str) -> None:
+        """Initialise an ExistingKeyScan.
+
+        Args:
+            table_name: The name of the table.
+        """
+        self.table_name = table_name
+        self._lock = threading.Lock()
+        # The columns of the constraints whose keys have not been read yet, of those
+        # being read, and the keys of those that have been.
+        self._unread: list[tuple[str, ...]] = []
+        self._scanning: set[tuple[str, ...]] = set()
+        self._keys: dict[tuple[str, ...], KeyFingerprints] = {}
+
+    def register(self, column_names: List[str]) -> None:
+        """Have the next scan read the keys of a constraint on `column_names`."""
+        with self._lock:
+            self._register(tuple(column_names))
+
+    def _register(self, constraint: tuple[str, ...]) -> None:
+        """Register a constraint, with the lock held."""
+        if (
+            constraint not in self._unread
+            and constraint not in self._scanning
+            and constraint not in self._keys
+        ):
+            self._unread.append(constraint)
+
+    def existing_keys(
+        self, dst_db_conn: sqla.Connection, column_names: List[str]
+    ) -> KeyFingerprints:
+        """Return the existing keys of a constraint, scanning the table if need be.
+
+        Args:
+            dst_db_conn: The connection to the destination database.
+            column_names: The columns of the constraint.
+        """
+        constraint = tuple(column_names)
+        with self._lock:
+            if constraint in self._keys:
+                return self._keys[constraint]
+            self._register(constraint)
+            if constraint in self._scanning:
+                # Another scan is reading the keys already.
+                claimed: list[tuple[str, ...]] = []
+                constraints = [constraint]
+            else:
+                claimed = constraints = self._unread
+                self._unread = []
+                self._scanning.update(claimed)
+        try:
+            keys = self._scan(dst_db_conn, constraints)
+        except BaseException:
+            with self._lock:
+                self._scanning.difference_update(claimed)
+                for unread in claimed:
+                    self._register(unread)
+            raise
+        with self._lock:
+            self._scanning.difference_update(claimed)
+            for scanned, fingerprints in keys.items():
+                self._keys.setdefault(scanned, fingerprints)
+            return self._keys[constraint]
+
+    def _scan(
+        self, dst_db_conn: sqla.Connection, constraints: list[tuple[str, ...]]
+    ) -> dict[tuple[str, ...], KeyFingerprints]:
+        """Read the keys of several constraints with one query."""
+        all_column_names = list(dict.fromkeys(sum(constraints, ())))
+        indices = {
+            constraint: [all_column_names.index(name) for name in constraint]
+            for constraint in constraints
+        }
+        fingerprints: dict[tuple[str, ...], list[np.ndarray]] = {
+            constraint: [] for constraint in constraints
+        }
+        query_text = f"SELECT {','.join(all_column_names)} FROM {self.table_name}"
+        query_result = dst_db_conn.execute(
+            sqla.text(query_text), execution_options={"yield_per": _YIELD_PER}
+        )
+        for rows in query_result.partitions():
+            for constraint, constraint_indices in indices.items():
+                fingerprints[constraint].append(
+                    np.fromiter(
+                        (
+                            hash(tuple(row[i] for i in constraint_indices))
+                            for row in rows
+                        ),
+                        dtype=np.int64,
+                        count=len(rows),
+                    )
+                )
+        return {
+            constraint: KeyFingerprints.from_fingerprints(
+                np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+            )
+            for constraint, chunks in fingerprints.items()
+        }
+
 
 class UniqueGenerator:
     """Class to ensure values generated for given columns are unique.
@@ -13,7 +213,7 @@ class UniqueGenerator:
 
     The generation works by repeatedly generating new values until a unique one is
     found. Old values already in the database are loaded to memory when the instance is
-    first called to generate values.
+    first called to generate values, as fingerprints, see `KeyFingerprints`.
 
     Attributes:
         column_names (List[str]): Columns to which the unique constraint applies.
@@ -21,7 +221,13 @@ class UniqueGenerator:
         max_tries (int): The maximum number of attempts to generate a unique key.
     """
 
-    def __init__(self, columns: List[str], table_name: str, max_tries: int = 100):
+    def __init__(
+        self,
+        columns: List[str],
+        table_name: str,
+        max_tries: int = 100,
+        key_scan: Optional[ExistingKeyScan] = None,
+    ):
         """
         Initialise a UniqueGenerator.
 
@@ -29,13 +235,20 @@ class UniqueGenerator:
             column_names (List[str]): Columns to which the unique constraint applies.
             table_name (str): The name of the table.
             max_tries (int): The maximum number of attempts to generate a unique key.
+            key_scan (ExistingKeyScan): The scan to read existing keys with, shared with
+                the other UniqueGenerators of the table so that it is only read once.
+                If not given, the UniqueGenerator reads the table on its own.
         """
-        self.existing_keys: Optional[Set[Any]] = None
+        self.existing_keys: Optional[KeyFingerprints] = None
         self.column_names = columns
         self.table_name = table_name
         self.max_tries = max_tries
+        self.key_scan = (
+            key_scan if key_scan is not None else ExistingKeyScan(table_name)
+        )
+        self.key_scan.register(columns)
 
-    def get_existing_keys(self, dst_db_conn: sqla.Connection) -> set:
+    def get_existing_keys(self, dst_db_conn: sqla.Connection) -> KeyFingerprints:
         """
         Retrieve existing keys from the database.
 
@@ -43,12 +256,9 @@ class UniqueGenerator:
             dst_db_conn: The connection to the destination database.
 
         Returns:
-            keys (set): A set of existing keys retrieved from the database.
+            keys (KeyFingerprints): The existing keys retrieved from the database.
         """
-        query_text = f"SELECT {','.join(self.column_names)} FROM {self.table_name}"
-        query_result = dst_db_conn.execute(sqla.text(query_text)).fetchall()
-        keys = set(query_result)
-        return keys
+        return self.key_scan.existing_keys(dst_db_conn, self.column_names)
 
     def __call__(
         self,
@@ -123,3 +333,118 @@ class UniqueGenerator:
             f"{self.column_names} in {self.table_name} after {self.max_tries} attempts."
         )
         raise RuntimeError(msg)
+
+
+def set_worker(index: int, num_workers: int) -> None:
+    """Tell the `PermutedSequence`s of this process which worker process it is.
+
+    Each worker then takes every `num_workers`-th position of each sequence, starting
+    at `index`, so that the workers never make the same value.
+    """
+    global _worker  # pylint: disable=global-statement
+    _worker = (index, num_workers)
+
+
+def get_worker() -> Tuple[int, int]:
+    """Return the index of this worker process and the number of workers."""
+    return _worker
+
+
+def _mix(value: int) -> int:
+    """Scramble the bits of a 64-bit integer, as the finaliser of SplitMix64 does."""
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK_64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK_64
+    return value ^ (value >> 31)
+
+
+class FeistelPermutation:
+    """A keyed pseudo-random permutation of the integers from 0 to `size - 1`.
+
+    The integers are written with an even number of bits, and shuffled by a balanced
+    Feistel network, which is a permutation of all the integers of that many bits
+    whatever its round function. Results that are `size` or more are shuffled again
+    until they are less ("cycle walking"), which is a permutation of the integers
+    below `size`. As there are fewer than four times as many integers of the network's
+    width, that takes fewer than four goes on average.
+    """
+
+    def __init__(self, size: int, key: int = 0) -> None:
+        """Initialise a FeistelPermutation.
+
+        Args:
+            size: The number of integers to permute.
+            key: The key of the permutation. Different keys give unrelated
+                permutations, the same key always the same one.
+        """
+        if size < 1:
+            raise ValueError("A permutation needs at least one value.")
+        self.size = size
+        self._half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+        self._half_mask = (1 << self._half_bits) - 1
+        self._round_keys = [
+            _mix((key + round_number * 0x9E3779B97F4A7C15) & _MASK_64)
+            for round_number in range(_FEISTEL_ROUNDS)
+        ]
+
+    def _round(self, half: int, round_key: int) -> int:
+        """Return the round function of the network for one half of a value."""
+        # Halves wider than 64 bits are folded into 64 first.
+        folded = (half ^ (half >> 64)) & _MASK_64
+        return _mix(folded ^ round_key) & self._half_mask
+
+    def _shuffle(self, value: int) -> int:
+        """Pass a value through the Feistel network once."""
+        left, right = value >> self._half_bits, value & self._half_mask
+        for round_key in self._round_keys:
+            left, right = right, left ^ self._round(right, round_key)
+        return (left << self._half_bits) | right
+
+    def __getitem__(self, index: int) -> int:
+        """Return the integer that `index` is mapped to."""
+        if not 0 <= index < self.size:
+            raise IndexError("Permutation index out of range")
+        value = self._shuffle(index)
+        while value >= self.size:
+            value = self._shuffle(value)
+        return value
+
+
+class PermutedSequence:
+    """Integers from 0 to `size - 1` in a pseudo-random order, none of them twice.
+
+    The n-th integer is the n-th entry of a `FeistelPermutation`, so each takes the same
+    time to make however many have been made before, unlike generating random values
+    until one hasn't been seen. Worker processes of create-data take turns at the
+    positions of the permutation, see `set_worker`, so with the same key they make the
+    same values between them as a single process would, and never the same one twice.
+    """
+
+    def __init__(self, size: int, key: int = 0, start: int = 0) -> None:
+        """Initialise a PermutedSequence.
+
+        Args:
+            size: The number of integers.
+            key: The key of the permutation.
+            start: The position in the permutation to start at, such as the number of
+                values made by earlier runs with the same key.
+        """
+        self.permutation = FeistelPermutation(size, key)
+        self.start = start
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def __call__(self) -> int:
+        """Return the next integer of the sequence.
+
+        Raises:
+            RuntimeError: If all the integers have been made.
+        """
+        with self._lock:
+            count = next(self._counter)
+        worker_index, num_workers = _worker
+        position = self.start + worker_index + count * num_workers
+        if position >= self.permutation.size:
+            raise RuntimeError(
+                f"All {self.permutation.size} values of the sequence have been used."
+            )
+        return self.permutation[position]
@@ -8,7 +8,6 @@ from pathlib import Path
 from types import ModuleType
 from typing import Any, Final, Mapping, Optional, Union
 
-import yaml
 from jsonschema.exceptions import ValidationError
 from jsonschema.validators import validate
 from sqlalchemy import Engine, create_engine, event, select
@@ -16,6 +15,8 @@ from sqlalchemy.engine.interfaces import DBAPIConnection
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlalchemy.schema import MetaData, Table
 
+from sqlsynthgen import serialisation
+
 # Define some types used repeatedly in the code base
 MaybeAsyncEngine = Union[Engine, AsyncEngine]
 
@@ -29,13 +30,13 @@ def read_config_file(path: str) -> dict:
     """Read a config file, warning if it is invalid.
 
     Args:
-        path: The path to a YAML-format config file.
+        path: The path to a YAML-format config file, or a JSON or MessagePack one if
+            its name ends in .json or .msgpack.
 
     Returns:
         The config file as a dictionary.
     """
-    with open(path, "r", encoding="utf8") as f:
-        config = yaml.safe_load(f)
+    config = serialisation.load(path)
 
     assert isinstance(config, dict)
 
@@ -74,13 +75,16 @@ def import_file(file_path: str) -> ModuleType:
 def download_table(
     table: Table, engine: Engine, yaml_file_name: Union[str, Path]
 ) -> None:
-    """Download a Table and store it as a .yaml file."""
+    """Download a Table and store it as a .yaml file.
+
+    The rows are stored as JSON or MessagePack instead if the name of the file ends in
+    .json or .msgpack.
+    """
     stmt = select(table)
     with engine.connect() as conn:
         result = [dict(row) for row in conn.execute(stmt).mappings()]
 
-    with Path(yaml_file_name).open("w", newline="", encoding="utf-8") as yamlfile:
-        yamlfile.write(yaml.dump(result))
+    serialisation.dump(result, yaml_file_name)
 
 
 def get_sync_engine(engine: MaybeAsyncEngine) -> Engine:
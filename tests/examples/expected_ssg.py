@@ -1,10 +1,9 @@
 """This file was auto-generated by sqlsynthgen but can be edited manually."""
-from mimesis import Generic
 from mimesis.locales import Locale
-from sqlsynthgen.base import FileUploader, TableGenerator
-from sqlsynthgen.unique_generator import UniqueGenerator
+from sqlsynthgen.base import FanOut, FileUploader, TableGenerator, ThreadLocalGeneric
+from sqlsynthgen.unique_generator import ExistingKeyScan, UniqueGenerator
 
-generic = Generic(locale=Locale.EN_GB)
+generic = ThreadLocalGeneric(locale=Locale.EN_GB)
 
 from sqlsynthgen.providers import BytesProvider
 
@@ -24,6 +23,9 @@ generic.add_provider(TimedeltaProvider)
 from sqlsynthgen.providers import TimespanProvider
 
 generic.add_provider(TimespanProvider)
+from sqlsynthgen.providers import UniquePermutationProvider
+
+generic.add_provider(UniquePermutationProvider)
 from sqlsynthgen.providers import WeightedBooleanProvider
 
 generic.add_provider(WeightedBooleanProvider)
@@ -32,10 +34,9 @@ import tests.examples.example_orm
 import row_generators
 import story_generators
 
-import yaml
+from sqlsynthgen.src_stats import load_src_stats
 
-with open("example_stats.yaml", "r", encoding="utf-8") as f:
-    SRC_STATS = yaml.unsafe_load(f)
+SRC_STATS = load_src_stats("example_stats.yaml")
 
 emptyvocabulary_vocab = FileUploader(
     tests.examples.example_orm.EmptyVocabulary.__table__
@@ -108,15 +109,18 @@ class unique_constraint_testGenerator(TableGenerator):
 
     def __init__(self):
         pass
+        key_scan = ExistingKeyScan("unique_constraint_test")
         self.unique_ab_uniq = UniqueGenerator(
             ["a", "b"],
             "unique_constraint_test",
             max_tries=50,
+            key_scan=key_scan,
         )
         self.unique_c_uniq = UniqueGenerator(
             ["c"],
             "unique_constraint_test",
             max_tries=50,
+            key_scan=key_scan,
         )
 
     def __call__(self, dst_db_conn):
@@ -133,15 +137,18 @@ class unique_constraint_test2Generator(TableGenerator):
 
     def __init__(self):
         pass
+        key_scan = ExistingKeyScan("unique_constraint_test2")
         self.unique_a_uniq2 = UniqueGenerator(
             ["a"],
             "unique_constraint_test2",
             max_tries=50,
+            key_scan=key_scan,
         )
         self.unique_abc_uniq2 = UniqueGenerator(
             ["a", "b", "c"],
             "unique_constraint_test2",
             max_tries=50,
+            key_scan=key_scan,
         )
 
     def __call__(self, dst_db_conn):
@@ -167,13 +174,18 @@ class test_entityGenerator(TableGenerator):
         result = {}
         result["single_letter_column"] = generic.person.password(1)
         result["vocabulary_entry_id"] = generic.column_value_provider.column_value(
-            dst_db_conn, tests.examples.example_orm.EmptyVocabulary, "entry_id"
+            dst_db_conn,
+            tests.examples.example_orm.EmptyVocabulary,
+            "entry_id",
+            strategy="cache",
         )
         return result
 
 
 class hospital_visitGenerator(TableGenerator):
     num_rows_per_pass = 3
+    insert_batch_size = 2
+    insert_strategy = "copy"
 
     def __init__(self):
         pass
@@ -188,11 +200,19 @@ class hospital_visitGenerator(TableGenerator):
             generic, 2021, 2022, min_dt_days=1, max_dt_days=30
         )
         result["person_id"] = generic.column_value_provider.column_value(
-            dst_db_conn, tests.examples.example_orm.Person, "person_id"
+            dst_db_conn,
+            tests.examples.example_orm.Person,
+            "person_id",
+            strategy="pk_range",
         )
         result["visit_image"] = generic.bytes_provider.bytes()
         result["visit_type_concept_id"] = generic.column_value_provider.column_value(
-            dst_db_conn, tests.examples.example_orm.Concept, "concept_id"
+            dst_db_conn,
+            tests.examples.example_orm.Concept,
+            "concept_id",
+            strategy="tablesample",
+            sample_percent=50,
+            reservoir_size=100,
         )
         return result
 
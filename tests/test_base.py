@@ -1,12 +1,15 @@
 """Tests for the base module."""
 import os
+import threading
 from pathlib import Path
+from typing import Any
 
 from sqlalchemy import Column, Integer, create_engine, select
 from sqlalchemy.orm import declarative_base
 
-from sqlsynthgen.base import FileUploader
-from tests.utils import RequiresDBTestCase, run_psql
+from sqlsynthgen.base import FanOut, FileUploader, ThreadLocalGeneric
+from sqlsynthgen.providers import NullProvider
+from tests.utils import RequiresDBTestCase, SSGTestCase, run_psql
 
 # pylint: disable=invalid-name
 Base = declarative_base()
@@ -53,3 +56,70 @@ class VocabTests(RequiresDBTestCase):
             statement = select(BaseTable)
             rows = list(conn.execute(statement))
         self.assertEqual(3, len(rows))
+
+
+class ThreadLocalGenericTests(SSGTestCase):
+    """Tests for the ThreadLocalGeneric class."""
+
+    def _in_thread(self, generic: ThreadLocalGeneric, name: str) -> dict[str, Any]:
+        """Get the `Generic` of a new thread with the given name, and a value from it."""
+        result: dict[str, Any] = {}
+
+        def target() -> None:
+            result["generic"] = generic._generic()  # pylint: disable=protected-access
+            result["value"] = generic.numeric.integer_number()
+
+        thread = threading.Thread(target=target, name=name)
+        thread.start()
+        thread.join()
+        return result
+
+    def test_instance_per_thread(self) -> None:
+        """Test that each thread gets its own instance, with the custom providers."""
+        generic = ThreadLocalGeneric()
+        generic.add_provider(NullProvider)
+        in_thread = self._in_thread(generic, "other")
+
+        # pylint: disable=protected-access
+        self.assertIsNot(generic._generic(), in_thread["generic"])
+        self.assertIs(generic._generic(), generic._generic())
+        self.assertIsNone(generic.null_provider.null())
+        self.assertIsNone(in_thread["generic"].null_provider.null())
+
+    def test_seeds(self) -> None:
+        """Test that threads have reproducible seeds that differ from each other."""
+        first = ThreadLocalGeneric(seed=42)
+        second = ThreadLocalGeneric(seed=42)
+
+        self.assertEqual(
+            first.numeric.integer_number(), second.numeric.integer_number()
+        )
+        self.assertEqual(
+            self._in_thread(first, "worker-1")["value"],
+            self._in_thread(second, "worker-1")["value"],
+        )
+        values = {self._in_thread(first, f"worker-{i}")["value"] for i in range(2, 12)}
+        self.assertGreater(len(values), 1)
+
+
+class FanOutTests(SSGTestCase):
+    """Tests for the FanOut class."""
+
+    def test_num_rows(self) -> None:
+        """Test that numbers of rows are only drawn from the counts with weight."""
+        fan_out = FanOut("parent_id", counts=[0, 1, 5], weights=[0, 1, 1])
+        numbers = {fan_out.num_rows() for _ in range(100)}
+        self.assertTrue(numbers <= {1, 5})
+        self.assertEqual(5, FanOut("parent_id", counts=[5]).num_rows())
+
+    def test_from_src_stats(self) -> None:
+        """Test making a FanOut from the result of a src-stats query."""
+        fan_out = FanOut.from_src_stats(
+            "parent_id",
+            [{"num_children": 1, "num": 10}, {"num_children": 3, "num": 2}],
+            count_column="num_children",
+            weights_column="num",
+        )
+        self.assertEqual(
+            FanOut("parent_id", counts=[1, 3], weights=[10.0, 2.0]), fan_out
+        )
@@ -359,11 +359,11 @@ class DBFunctionalTestCase(RequiresDBTestCase):
         self.assertEqual(
             "Creating data.\n"
             'Generating data for story "story_generators.short_story".\n'
-            'Generating data for story "story_generators.short_story".\n'
-            'Generating data for story "story_generators.short_story".\n'
             'Generating data for story "story_generators.full_row_story".\n'
             'Generating data for story "story_generators.long_story".\n'
+            'Generating data for story "story_generators.short_story".\n'
             'Generating data for story "story_generators.long_story".\n'
+            'Generating data for story "story_generators.short_story".\n'
             'Generating data for table "data_type_test".\n'
             'Generating data for table "no_pk_test".\n'
             'Generating data for table "person".\n'
@@ -373,11 +373,11 @@ class DBFunctionalTestCase(RequiresDBTestCase):
             'Generating data for table "test_entity".\n'
             'Generating data for table "hospital_visit".\n'
             'Generating data for story "story_generators.short_story".\n'
-            'Generating data for story "story_generators.short_story".\n'
-            'Generating data for story "story_generators.short_story".\n'
             'Generating data for story "story_generators.full_row_story".\n'
             'Generating data for story "story_generators.long_story".\n'
+            'Generating data for story "story_generators.short_story".\n'
             'Generating data for story "story_generators.long_story".\n'
+            'Generating data for story "story_generators.short_story".\n'
             'Generating data for table "data_type_test".\n'
             'Generating data for table "no_pk_test".\n'
             'Generating data for table "person".\n'
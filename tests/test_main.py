@@ -13,7 +13,7 @@ from tests.utils import SSGTestCase, get_test_settings
 runner = CliRunner(mix_stderr=False)
 
 
-class TestCLI(SSGTestCase):
+class TestCLI(SSGTestCase):  # pylint: disable=too-many-public-methods
     """Tests for the command-line interface."""
 
     @patch("sqlsynthgen.main.import_file")
@@ -149,7 +149,39 @@ class TestCLI(SSGTestCase):
             catch_exceptions=False,
         )
 
-        mock_create.assert_called_once_with(mock_import.return_value.Base.metadata)
+        mock_create.assert_called_once_with(
+            mock_import.return_value.Base.metadata, bulk_load=False
+        )
+        self.assertSuccess(result)
+
+    @patch("sqlsynthgen.main.create_db_tables")
+    @patch("sqlsynthgen.main.import_file")
+    def test_create_tables_bulk_load(
+        self, mock_import: MagicMock, mock_create: MagicMock
+    ) -> None:
+        """Test the create-tables sub-command with --bulk-load."""
+        result = runner.invoke(
+            app, ["create-tables", "--bulk-load"], catch_exceptions=False
+        )
+
+        mock_create.assert_called_once_with(
+            mock_import.return_value.Base.metadata, bulk_load=True
+        )
+        self.assertSuccess(result)
+
+    @patch("sqlsynthgen.main.finalise_db_tables")
+    @patch("sqlsynthgen.main.import_file")
+    def test_finalise_tables(
+        self, mock_import: MagicMock, mock_finalise: MagicMock
+    ) -> None:
+        """Test the finalise-tables sub-command."""
+        result = runner.invoke(
+            app, ["finalise-tables", "--workers=2"], catch_exceptions=False
+        )
+
+        mock_finalise.assert_called_once_with(
+            mock_import.return_value.Base.metadata, workers=2
+        )
         self.assertSuccess(result)
 
     @patch("sqlsynthgen.main.logger")
@@ -181,6 +213,7 @@ class TestCLI(SSGTestCase):
             mock_import.return_value.table_generator_dict,
             mock_import.return_value.story_generator_list,
             1,
+            {},
         )
         self.assertSuccess(result)
 
@@ -192,6 +225,62 @@ class TestCLI(SSGTestCase):
             ]
         )
 
+    @patch("sqlsynthgen.main.import_file")
+    @patch("sqlsynthgen.main.create_db_data_in_workers")
+    def test_create_data_workers(
+        self, mock_create: MagicMock, mock_import: MagicMock
+    ) -> None:
+        """Test the create-data sub-command with several workers."""
+        mock_create.return_value = {"a": 2}
+        result = runner.invoke(
+            app,
+            ["create-data", "--num-passes=4", "--workers=2", "--seed=7"],
+            catch_exceptions=False,
+        )
+
+        self.assertSuccess(result)
+        mock_import.assert_not_called()
+        mock_create.assert_called_once_with("orm.py", "ssg.py", {}, 4, 2, 7)
+
+    @patch("sqlsynthgen.main.seed_generators")
+    @patch("sqlsynthgen.main.import_file")
+    @patch("sqlsynthgen.main.create_db_data")
+    def test_create_data_seed(
+        self, mock_create: MagicMock, mock_import: MagicMock, mock_seed: MagicMock
+    ) -> None:
+        """Test that create-data seeds the generators when given a seed."""
+        mock_create.return_value = {}
+        result = runner.invoke(app, ["create-data", "--seed=7"], catch_exceptions=False)
+
+        self.assertSuccess(result)
+        mock_seed.assert_called_once_with(mock_import.return_value, "7")
+
+    @patch("sqlsynthgen.main.logger")
+    @patch("sqlsynthgen.main.read_config_file")
+    @patch("sqlsynthgen.main.seed_generators")
+    @patch("sqlsynthgen.main.import_file")
+    @patch("sqlsynthgen.main.create_db_data")
+    def test_create_data_seed_parallel_tables(
+        self,
+        mock_create: MagicMock,
+        _: MagicMock,
+        __: MagicMock,
+        mock_config: MagicMock,
+        mock_logger: MagicMock,
+    ) -> None:
+        """Test that create-data warns a seed can't reproduce parallel-tables runs."""
+        mock_create.return_value = {}
+        mock_config.return_value = {"parallel-tables": 2}
+        result = runner.invoke(
+            app,
+            ["create-data", "--seed=7", "--config-file=config.yaml"],
+            catch_exceptions=False,
+        )
+
+        self.assertSuccess(result)
+        mock_logger.warning.assert_called_once()
+        self.assertIn("reproducible", mock_logger.warning.call_args.args[0])
+
     @patch("sqlsynthgen.main.Path")
     @patch("sqlsynthgen.main.make_tables_file")
     @patch("sqlsynthgen.main.get_settings")
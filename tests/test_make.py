@@ -2,16 +2,29 @@
 import asyncio
 import os
 from pathlib import Path
+from types import ModuleType
 from unittest.mock import MagicMock, patch
 
 import yaml
 from pydantic import PostgresDsn
 from pydantic.tools import parse_obj_as
-from sqlalchemy import BigInteger, Column, String
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    ForeignKeyConstraint,
+    Integer,
+    MetaData,
+    String,
+    Table,
+)
 from sqlalchemy.dialects.mysql.types import INTEGER
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import declarative_base
 
 from sqlsynthgen.make import (
+    _get_composite_foreign_key_generators,
+    _get_fan_out,
+    _get_generator_for_table,
     _get_provider_for_column,
     make_src_stats,
     make_table_generators,
@@ -65,6 +78,31 @@ class TestMakeGenerators(SSGTestCase):
         mock_create.assert_called_once()
         self.assertEqual(expected, actual)
 
+    @patch("sqlsynthgen.make.Path")
+    @patch("sqlsynthgen.make.get_settings")
+    @patch("sqlsynthgen.utils.create_engine")
+    @patch("sqlsynthgen.make.download_table")
+    def test_make_table_generators_npz_stats(
+        self,
+        _: MagicMock,
+        __: MagicMock,
+        mock_get_settings: MagicMock,
+        mock_path: MagicMock,
+    ) -> None:
+        """Check that .npz src-stats files are loaded with load_src_stats."""
+        mock_path.return_value.exists.return_value = False
+        mock_get_settings.return_value = get_test_settings()
+        with open("example_config.yaml", "r", encoding="utf8") as f:
+            config = yaml.safe_load(f)
+
+        actual = make_table_generators(example_orm, config, "example_stats.npz")
+        self.assertIn(
+            "from sqlsynthgen.src_stats import load_src_stats\n\n"
+            'SRC_STATS = load_src_stats("example_stats.npz")\n',
+            actual,
+        )
+        self.assertNotIn("yaml", actual)
+
     @patch("sqlsynthgen.make.logger")
     @patch("sqlsynthgen.make.Path")
     @patch("sqlsynthgen.make.get_settings")
@@ -184,6 +222,114 @@ class TestMakeGenerators(SSGTestCase):
             "generic.cryptographic.uuid",
         )
 
+    def test_get_composite_foreign_key_generators(self) -> None:
+        """Test that the columns of composite foreign keys are sampled together."""
+        metadata = MetaData()
+        tables_module = ModuleType("composite_tables")
+        setattr(tables_module, "Base", declarative_base(metadata=metadata))
+        parent = Table(
+            "parent",
+            metadata,
+            Column("a", Integer, primary_key=True),
+            Column("b", Integer, primary_key=True),
+        )
+        setattr(tables_module, "t_parent", parent)
+        child = Table(
+            "child",
+            metadata,
+            Column("id", Integer, primary_key=True),
+            Column("parent_a", Integer),
+            Column("parent_b", Integer),
+            Column("other_a", Integer),
+            Column("other_b", Integer),
+            ForeignKeyConstraint(["parent_a", "parent_b"], ["parent.a", "parent.b"]),
+            ForeignKeyConstraint(["other_a", "other_b"], ["parent.a", "parent.b"]),
+        )
+
+        columns_covered = ["other_b"]
+        row_gens = _get_composite_foreign_key_generators(
+            tables_module, child, columns_covered
+        )
+        self.assertEqual(1, len(row_gens))
+        self.assertListEqual(["parent_a", "parent_b"], row_gens[0].variable_names)
+        self.assertEqual(
+            "generic.column_value_provider.column_values",
+            row_gens[0].function_call.function_name,
+        )
+        self.assertListEqual(
+            ["dst_db_conn", "composite_tables.t_parent", "['a', 'b']"],
+            row_gens[0].function_call.argument_values,
+        )
+        self.assertListEqual(["other_b", "parent_a", "parent_b"], columns_covered)
+
+    def test_on_conflict_do_nothing_skips_unique_generators(self) -> None:
+        """Test that tables written with ON CONFLICT DO NOTHING get no UniqueGenerators.
+
+        The database enforces their unique constraints instead.
+        """
+        metadata = MetaData()
+        tables_module = ModuleType("unique_tables")
+        setattr(tables_module, "Base", declarative_base(metadata=metadata))
+        table = Table(
+            "uniques",
+            metadata,
+            Column("id", Integer, primary_key=True),
+            Column("code", String(10), unique=True),
+        )
+
+        table_data = _get_generator_for_table(tables_module, {}, table)
+        self.assertEqual(1, len(table_data.unique_constraints))
+        self.assertTrue(
+            any(
+                row_gen.function_call.function_name.startswith("self.unique_")
+                for row_gen in table_data.row_gens
+            )
+        )
+
+        table_data = _get_generator_for_table(
+            tables_module, {"insert_strategy": "on_conflict_do_nothing"}, table
+        )
+        self.assertListEqual([], table_data.unique_constraints)
+        self.assertFalse(
+            any(
+                row_gen.function_call.function_name.startswith("self.unique_")
+                for row_gen in table_data.row_gens
+            )
+        )
+
+    def test_get_fan_out(self) -> None:
+        """Test the _get_fan_out function."""
+        self.assertIsNone(_get_fan_out({}))
+
+        fan_out = _get_fan_out(
+            {"fan_out": {"foreign_key": "person_id", "counts": [1, 2]}}
+        )
+        assert fan_out is not None
+        self.assertEqual("FanOut", fan_out.function_name)
+        self.assertListEqual(["'person_id'", "counts=[1, 2]"], fan_out.argument_values)
+
+        fan_out = _get_fan_out(
+            {
+                "fan_out": {
+                    "foreign_key": "person_id",
+                    "src_stats_query": "visits_per_person",
+                    "count_column": "num_visits",
+                    "weights_column": "num",
+                }
+            }
+        )
+        assert fan_out is not None
+        self.assertEqual("FanOut.from_src_stats", fan_out.function_name)
+        self.assertListEqual(
+            [
+                "'person_id'",
+                'SRC_STATS["visits_per_person"]',
+                "count_column='num_visits'",
+                "weights_column='num'",
+            ],
+            fan_out.argument_values,
+        )
+
 
 class TestMakeTables(SSGTestCase):
     """Test the make_tables function."""
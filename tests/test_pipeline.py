@@ -0,0 +1,92 @@
+"""Tests for the pipeline module."""
+import threading
+from typing import Any
+from unittest.mock import MagicMock
+
+from sqlalchemy import Column, Connection, ForeignKey, Integer, MetaData, Table
+
+from sqlsynthgen.pipeline import RowWriterPipeline
+from tests.utils import SSGTestCase
+
+
+class RowWriterPipelineTestCase(SSGTestCase):
+    """Tests for the RowWriterPipeline class."""
+
+    def setUp(self) -> None:
+        """Pre-test setup."""
+        metadata = MetaData()
+        self.parent = Table("parent", metadata, Column("id", Integer, primary_key=True))
+        self.child = Table(
+            "child", metadata, Column("parent_id", ForeignKey("parent.id"))
+        )
+        self.mock_engine = MagicMock()
+        self.written: list[tuple[str, list[dict[str, Any]]]] = []
+        self.lock = threading.Lock()
+
+    def insert(
+        self, table: Table, rows: list[dict[str, Any]], dst_conn: Connection
+    ) -> int:
+        """Record the rows as written."""
+        del dst_conn
+        with self.lock:
+            self.written.append((table.name, rows))
+        return len(rows)
+
+    def test_writes_batches(self) -> None:
+        """Test that all queued batches get written, each in a transaction."""
+        pipeline = RowWriterPipeline(self.mock_engine, writers=2, queue_size=1)
+        for i in range(5):
+            pipeline.put(self.parent, [{"id": i}], self.insert)
+        pipeline.close()
+
+        self.assertCountEqual([("parent", [{"id": i}]) for i in range(5)], self.written)
+        self.assertEqual(self.mock_engine.connect.call_count, 2)
+        dst_conn = self.mock_engine.connect.return_value
+        self.assertEqual(dst_conn.begin.call_count, 5)
+        self.assertEqual(pipeline.stats.batches, 5)
+        self.assertEqual({"parent": 5}, pipeline.row_counts)
+        self.assertLessEqual(pipeline.stats.max_queue_depth, 1)
+
+    def test_wait_for(self) -> None:
+        """Test waiting for the rows of one table while another's are still queued."""
+        release = threading.Event()
+
+        def slow_insert(
+            table: Table, rows: list[dict[str, Any]], dst_conn: Connection
+        ) -> int:
+            release.wait()
+            return self.insert(table, rows, dst_conn)
+
+        pipeline = RowWriterPipeline(self.mock_engine, writers=2, queue_size=4)
+        pipeline.put(self.child, [{"parent_id": 1}], slow_insert)
+        pipeline.put(self.parent, [{"id": 1}], self.insert)
+        pipeline.wait_for(["parent"])
+        self.assertListEqual([("parent", [{"id": 1}])], self.written)
+
+        release.set()
+        pipeline.wait_for_all()
+        self.assertEqual(len(self.written), 2)
+        pipeline.close()
+
+    def test_writer_error(self) -> None:
+        """Test that errors in the writers are raised in the generating thread."""
+        failing_insert = MagicMock(side_effect=ValueError("no good"))
+        pipeline = RowWriterPipeline(self.mock_engine, writers=1, queue_size=1)
+        pipeline.put(self.parent, [{"id": 1}], failing_insert)
+        with self.assertRaises(ValueError):
+            pipeline.wait_for_all()
+        # Later batches are discarded rather than left blocking the queue.
+        with self.assertRaises(ValueError):
+            pipeline.put(self.parent, [{"id": 2}], self.insert)
+        with self.assertRaises(ValueError):
+            pipeline.close()
+        self.assertListEqual([], self.written)
+
+    def test_connection_error(self) -> None:
+        """Test that a writer failing to connect doesn't leave the pipeline stuck."""
+        self.mock_engine.connect.side_effect = ConnectionError("no database")
+        pipeline = RowWriterPipeline(self.mock_engine, writers=1, queue_size=1)
+        with self.assertRaises(ConnectionError):
+            pipeline.wait_for_all()
+        with self.assertRaises(ConnectionError):
+            pipeline.close()
@@ -0,0 +1,70 @@
+"""Tests for the serialisation module."""
+import datetime as dt
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from unittest.mock import patch
+
+import yaml
+
+from sqlsynthgen import serialisation
+from sqlsynthgen.serialisation import SerialisationError, dump, load, yaml_load
+from tests.utils import SSGTestCase
+
+
+class SerialisationTestCase(SSGTestCase):
+    """Tests for reading and writing files by extension."""
+
+    data = {"rows": [{"id": 1, "name": "one", "ok": True, "score": 0.5, "x": None}]}
+
+    def setUp(self) -> None:
+        """Make a directory to write the files in."""
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(self.directory.cleanup)
+
+    def test_yaml_same_as_pyyaml(self) -> None:
+        """Test that YAML files are written as yaml.dump writes them."""
+        data = {"rows": [{"id": 1, "day": dt.date(2023, 1, 1), "dec": Decimal("1.5")}]}
+        path = Path(self.directory.name) / "data.yaml"
+        dump(data, path)
+        self.assertEqual(yaml.dump(data), path.read_text(encoding="utf-8"))
+        self.assertEqual(data, load(path, unsafe=True))
+
+    def test_yaml_safe(self) -> None:
+        """Test that YAML naming Python objects is only loaded if it's unsafe."""
+        text = yaml.dump(Decimal("1.5"))
+        self.assertEqual(Decimal("1.5"), yaml_load(text, unsafe=True))
+        with self.assertRaises(SerialisationError):
+            yaml_load(text)
+
+    def test_json(self) -> None:
+        """Test that .json files are written and read as JSON."""
+        path = Path(self.directory.name) / "data.json"
+        dump(self.data, path)
+        self.assertTrue(path.read_text(encoding="utf-8").startswith('{"rows": ['))
+        self.assertEqual(self.data, load(path))
+
+        with self.assertRaises(SerialisationError):
+            dump({"day": dt.date(2023, 1, 1)}, path)
+        path.write_text("{", encoding="utf-8")
+        with self.assertRaises(SerialisationError):
+            load(path)
+
+    def test_msgpack_not_installed(self) -> None:
+        """Test that .msgpack files need msgpack."""
+        path = Path(self.directory.name) / "data.msgpack"
+        with patch.object(serialisation, "msgpack", None):
+            with self.assertRaises(SerialisationError):
+                dump(self.data, path)
+            with self.assertRaises(SerialisationError):
+                load(path)
+        self.assertFalse(path.exists())
+
+    def test_msgpack(self) -> None:
+        """Test that .msgpack files are written and read as MessagePack."""
+        if serialisation.msgpack is None:
+            self.skipTest("msgpack is not installed")
+        path = Path(self.directory.name) / "data.msgpack"
+        dump(self.data, path)
+        self.assertEqual(self.data, load(path))
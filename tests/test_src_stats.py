@@ -0,0 +1,113 @@
+"""Tests for the src_stats module."""
+import datetime as dt
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import numpy as np
+
+from sqlsynthgen.src_stats import (
+    ColumnarResult,
+    NpzSrcStats,
+    _column_array,
+    _map_member,
+    load_src_stats,
+    write_src_stats,
+)
+from tests.utils import SSGTestCase
+
+
+class SrcStatsTestCase(SSGTestCase):
+    """Tests for writing and loading src-stats files."""
+
+    src_stats: dict[str, list[dict[str, Any]]] = {
+        "count_people": [
+            {"num": 3, "sex": "F", "weight": 60.5, "alive": True},
+            {"num": 2, "sex": "M", "weight": 70.0, "alive": False},
+        ],
+        "mixed_types": [
+            {"value": None, "day": dt.date(2023, 1, 1), "amount": Decimal("1.5")},
+            {"value": 1, "day": dt.date(2023, 1, 2), "amount": Decimal("2")},
+            {"value": "one", "day": dt.date(2023, 1, 3), "amount": Decimal("3")},
+        ],
+        "big_numbers": [{"num": 2**70}],
+        "no_rows": [],
+    }
+
+    def setUp(self) -> None:
+        """Make a directory to write the files in."""
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(self.directory.cleanup)
+
+    def test_npz_round_trip(self) -> None:
+        """Test that .npz files give back the results as they were, types and all."""
+        path = Path(self.directory.name) / "src-stats.npz"
+        write_src_stats(self.src_stats, path)
+
+        loaded = load_src_stats(path)
+        self.assertIsInstance(loaded, NpzSrcStats)
+        self.assertListEqual(list(self.src_stats), list(loaded))
+        self.assertEqual(4, len(loaded))
+        for name, result in self.src_stats.items():
+            self.assertListEqual(result, list(loaded[name]))
+            for row, loaded_row in zip(result, loaded[name]):
+                for column, value in row.items():
+                    self.assertIs(type(value), type(loaded_row[column]))
+        with self.assertRaises(KeyError):
+            _ = loaded["unknown"]
+
+    def test_npz_mapped(self) -> None:
+        """Test that columns are mapped when first looked up, unless of objects."""
+        path = Path(self.directory.name) / "src-stats.npz"
+        write_src_stats(self.src_stats, path)
+        loaded = load_src_stats(path)
+
+        with patch(
+            "sqlsynthgen.src_stats._map_member",
+            wraps=_map_member,
+        ) as mock_map_member:
+            self.assertEqual(0, mock_map_member.call_count)
+            count_people = loaded["count_people"]
+            self.assertIs(count_people, loaded["count_people"])
+            self.assertEqual(4, mock_map_member.call_count)
+            mixed_types = loaded["mixed_types"]
+        assert isinstance(count_people, ColumnarResult)
+        assert isinstance(mixed_types, ColumnarResult)
+        for column in count_people.columns.values():
+            self.assertIsInstance(column, np.memmap)
+            self.assertFalse(column.flags.writeable)
+        for column in mixed_types.columns.values():
+            self.assertNotIsInstance(column, np.memmap)
+
+    def test_string_columns(self) -> None:
+        """Test that strings are only padded to a fixed width if they're alike."""
+        similar = _column_array(["F", "M", "X"])
+        self.assertEqual(np.dtype("<U1"), similar.dtype)
+        varied = ["a" * 100, *["b"] * 99]
+        varied_array = _column_array(varied)
+        self.assertEqual(np.dtype(object), varied_array.dtype)
+        self.assertListEqual(varied, varied_array.tolist())
+        self.assertEqual("U", _column_array(["", ""]).dtype.kind)
+
+    def test_columnar_result(self) -> None:
+        """Test that a ColumnarResult can be used as a list of rows."""
+        result = ColumnarResult(
+            {"num": np.array([3, 2]), "sex": np.array(["F", None], dtype=object)}
+        )
+        self.assertEqual(2, len(result))
+        self.assertDictEqual({"num": 2, "sex": None}, result[-1])
+        self.assertIs(int, type(result[0]["num"]))
+        self.assertListEqual([{"num": 3, "sex": "F"}], result[:1])
+        with self.assertRaises(IndexError):
+            _ = result[2]
+        self.assertListEqual([], list(ColumnarResult({})))
+
+    def test_yaml_round_trip(self) -> None:
+        """Test that files with other names are written and read as YAML."""
+        path = Path(self.directory.name) / "src-stats.yaml"
+        write_src_stats(self.src_stats, path)
+        self.assertTrue(path.read_text(encoding="utf-8").startswith("big_numbers:"))
+        self.assertDictEqual(self.src_stats, dict(load_src_stats(path)))
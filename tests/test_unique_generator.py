@@ -1,10 +1,11 @@
 """Tests for the unique_generator module."""
 from pathlib import Path
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from sqlalchemy import (
     Boolean,
     Column,
+    Connection,
     Integer,
     Text,
     UniqueConstraint,
@@ -13,8 +14,15 @@ from sqlalchemy import (
 )
 from sqlalchemy.ext.declarative import declarative_base
 
-from sqlsynthgen.unique_generator import UniqueGenerator
-from tests.utils import RequiresDBTestCase, run_psql
+from sqlsynthgen.unique_generator import (
+    ExistingKeyScan,
+    FeistelPermutation,
+    KeyFingerprints,
+    PermutedSequence,
+    UniqueGenerator,
+    set_worker,
+)
+from tests.utils import RequiresDBTestCase, SSGTestCase, run_psql
 
 # pylint: disable=invalid-name
 Base = declarative_base()
@@ -33,6 +41,82 @@ class TestTable(Base):  # type: ignore
     c = Column(Text, unique=True)
 
 
+class KeyFingerprintsTestCase(SSGTestCase):
+    """Tests for the KeyFingerprints class."""
+
+    def test_contains(self) -> None:
+        """Test that keys are found whether they were given at first or added."""
+        keys = KeyFingerprints([(1, "a"), (2, "b"), (1, "a")])
+        self.assertEqual(2, len(keys))
+        self.assertIn((1, "a"), keys)
+        self.assertNotIn((3, "c"), keys)
+
+        keys.add((3, "c"))
+        keys.add((3, "c"))
+        keys.add((1, "a"))
+        self.assertEqual(3, len(keys))
+        self.assertIn((3, "c"), keys)
+        self.assertNotIn((4, "d"), keys)
+
+    @patch("sqlsynthgen.unique_generator._MIN_PENDING", 4)
+    def test_merge(self) -> None:
+        """Test that added keys are still found after being merged into the array."""
+        keys = KeyFingerprints()
+        for number in range(100):
+            keys.add((number,))
+        self.assertEqual(100, len(keys))
+        # pylint: disable=protected-access
+        self.assertLess(len(keys._pending), 100)
+        self.assertTrue(all((number,) in keys for number in range(100)))
+        self.assertFalse(any((number,) in keys for number in range(100, 200)))
+
+
+class PermutationTestCase(SSGTestCase):
+    """Tests for the FeistelPermutation and PermutedSequence classes."""
+
+    def test_feistel_permutation(self) -> None:
+        """Test that permutations of various sizes are permutations."""
+        for size in [1, 2, 3, 7, 16, 1000, 4099]:
+            with self.subTest(size=size):
+                permutation = FeistelPermutation(size, key=size)
+                self.assertListEqual(
+                    list(range(size)),
+                    sorted(permutation[index] for index in range(size)),
+                )
+        with self.assertRaises(IndexError):
+            _ = FeistelPermutation(10)[10]
+        with self.assertRaises(ValueError):
+            FeistelPermutation(0)
+
+        # Domains wider than 128 bits work too.
+        permutation = FeistelPermutation(36**30)
+        values = {permutation[index] for index in range(1000)}
+        self.assertEqual(1000, len(values))
+        self.assertTrue(all(0 <= value < 36**30 for value in values))
+
+    def test_permuted_sequence_workers(self) -> None:
+        """Test that workers make the values of a single process between them."""
+        self.addCleanup(set_worker, 0, 1)
+        single = PermutedSequence(100, key=3)
+        expected = [single() for _ in range(100)]
+
+        worker_values = []
+        for index in range(3):
+            set_worker(index, 3)
+            sequence = PermutedSequence(100, key=3)
+            while True:
+                try:
+                    worker_values.append(sequence())
+                except RuntimeError:
+                    break
+        self.assertListEqual(sorted(expected), sorted(worker_values))
+
+        # A sequence that starts later carries on where the first run left off.
+        set_worker(0, 1)
+        started = PermutedSequence(100, key=3, start=40)
+        self.assertListEqual(expected[40:], [started() for _ in range(60)])
+
+
 class UniqueGeneratorTestCase(RequiresDBTestCase):
     """Tests for the UniqueGenerator class.
 
@@ -101,6 +185,73 @@ class UniqueGeneratorTestCase(RequiresDBTestCase):
             self.assertEqual(uniq_c(conn, ["c"], lambda: string2), string2)
             self.assertRaises(RuntimeError, uniq_c, conn, ["c"], lambda: string1)
 
+    @patch("sqlsynthgen.unique_generator._YIELD_PER", 2)
+    def test_shared_key_scan(self) -> None:
+        """Test that UniqueGenerators sharing a scan read the table once between them.
+
+        The rows are read two at a time, so the keys of both constraints come from
+        several chunks.
+        """
+        table_name = TestTable.__tablename__
+        key_scan = ExistingKeyScan(table_name)
+        uniq_ab = UniqueGenerator(["a", "b"], table_name, key_scan=key_scan)
+        uniq_c = UniqueGenerator(["c"], table_name, max_tries=10, key_scan=key_scan)
+
+        with self.engine.connect() as conn:
+            conn.execute(
+                insert(TestTable).values(
+                    [
+                        {"a": True, "b": False, "c": "String 1"},
+                        {"a": False, "b": False, "c": "String 2"},
+                        {"a": True, "b": True, "c": "String 3"},
+                    ]
+                )
+            )
+            # pylint: disable=protected-access
+            with patch.object(key_scan, "_scan", wraps=key_scan._scan) as mock_scan:
+                self.assertRaises(RuntimeError, uniq_c, conn, ["c"], lambda: "String 3")
+                self.assertRaises(
+                    RuntimeError, uniq_ab, conn, ["a", "b"], lambda: [False, False]
+                )
+                self.assertEqual(
+                    uniq_ab(conn, ["a", "b"], lambda: [False, True]), [False, True]
+                )
+            mock_scan.assert_called_once()
+
+    def test_concurrent_key_scans(self) -> None:
+        """Test that UniqueGenerators asking for keys being read share them.
+
+        Batches generated concurrently can ask for the keys of a constraint while the
+        scan reading them is waiting for the database.
+        """
+        table_name = TestTable.__tablename__
+        key_scan = ExistingKeyScan(table_name)
+        uniq_ab = UniqueGenerator(["a", "b"], table_name, key_scan=key_scan)
+        uniq_c = UniqueGenerator(["c"], table_name, max_tries=10, key_scan=key_scan)
+        # pylint: disable=protected-access
+        scan = key_scan._scan
+        first_scan = [True]
+
+        def scan_concurrently(conn: Connection, constraints: list) -> dict:
+            """Generate values of other batches while the first scan is under way."""
+            if first_scan:
+                first_scan.clear()
+                self.assertEqual("String 1", uniq_c(conn, ["c"], lambda: "String 1"))
+                self.assertEqual(
+                    [True, True], uniq_ab(conn, ["a", "b"], lambda: [True, True])
+                )
+            return scan(conn, constraints)
+
+        with self.engine.connect() as conn:
+            with patch.object(
+                key_scan, "_scan", side_effect=scan_concurrently
+            ) as mock_scan:
+                self.assertRaises(RuntimeError, uniq_c, conn, ["c"], lambda: "String 1")
+                self.assertRaises(
+                    RuntimeError, uniq_ab, conn, ["a", "b"], lambda: [True, True]
+                )
+            self.assertEqual(3, mock_scan.call_count)
+
     def test_unique_generator_multivalue_generator(self) -> None:
         """Test that UniqueGenerator can handle row generators that return multiple
         values.